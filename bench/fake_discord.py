@@ -0,0 +1,214 @@
+# bench/fake_discord.py
+"""Substituto local do gateway e da API HTTP do Discord para os benchmarks.
+
+Só implementa o que o bot.py usa: servidores, membros, canais de voz/texto e
+mensagens. Cada chamada HTTP (send/edit/pin) espera uma latência simulada e
+pode receber 429, tratado como o HTTPClient do discord.py trata: aviso no
+logger "discord.http", espera do retry_after e nova tentativa. Os eventos de voz são entregues chamando
+o handler do bot, do mesmo jeito que o discord.py faz ao receber do gateway.
+"""
+import asyncio
+import collections
+import itertools
+import logging
+import random
+from typing import Callable, Dict, List, Optional
+
+import discord
+
+_snowflakes = itertools.count(10_000_000)
+
+API_BASE = "https://discord.com/api/v10"
+HTTP_TRIES = 5  # tentativas do discord.py antes de levantar a exceção
+http_log = logging.getLogger("discord.http")
+
+
+def next_id() -> int:
+    return next(_snowflakes)
+
+
+class FakeResponse:
+    """O mínimo de aiohttp.ClientResponse para montar um discord.HTTPException."""
+
+    def __init__(self, status: int, reason: str, retry_after: float = 0.0):
+        self.status = status
+        self.reason = reason
+        self.headers = {"Retry-After": str(retry_after)}
+
+
+class FakeHTTP:
+    """Camada HTTP simulada: latência, 429 aleatórios e contadores por rota."""
+
+    def __init__(self, latency=(0.03, 0.12), rate_limit_chance: float = 0.0,
+                 retry_after: float = 1.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.rate_limit_chance = rate_limit_chance
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.counts: Dict[str, int] = collections.Counter()
+        self.rate_limited = 0
+
+    async def request(self, route: str, method: str, path: str):
+        for _ in range(HTTP_TRIES):
+            await asyncio.sleep(self.random.uniform(*self.latency))
+            if not (self.rate_limit_chance and self.random.random() < self.rate_limit_chance):
+                self.counts[route] += 1
+                return
+            self.rate_limited += 1
+            http_log.warning("We are being rate limited. %s %s responded with 429. Retrying in %.2f seconds.",
+                             method, API_BASE + path, self.retry_after)
+            await asyncio.sleep(self.retry_after)
+        raise discord.HTTPException(FakeResponse(429, "Too Many Requests", self.retry_after),
+                                    {"message": "You are being rate limited.", "code": 0})
+
+
+class FakeAsset:
+    def __init__(self, member_id: int):
+        self.url = f"https://cdn.discordapp.com/embed/avatars/{member_id % 5}.png"
+
+
+class FakePermissions:
+    send_messages = True
+    embed_links = True
+
+
+class FakeMessage:
+    """Mensagem do lado do "servidor": o canal não guarda referência a ela."""
+
+    def __init__(self, channel: "FakeTextChannel", content=None, embed=None, embeds=None,
+                 message_id: Optional[int] = None):
+        self.id = message_id or next_id()
+        self.channel = channel
+        self.author = channel.guild.me
+        self.content = content
+        self.embeds = embeds or ([embed] if embed else [])
+
+    async def edit(self, content=None, embed=None, embeds=None, **kwargs):
+        await self.channel.http.request("edit", "PATCH", f"/channels/{self.channel.id}/messages/{self.id}")
+        self.content = content
+        self.embeds = embeds or ([embed] if embed else [])
+        return self
+
+    async def pin(self, **kwargs):
+        await self.channel.http.request("pin", "PUT", f"/channels/{self.channel.id}/pins/{self.id}")
+        self.channel.pinned.append(self)
+
+
+class FakeTextChannel(discord.TextChannel):
+    """Passa no isinstance(ch, discord.TextChannel) do bot sem estado real do discord.py."""
+
+    category = None
+
+    def __init__(self, guild: "FakeGuild", name: str, http: FakeHTTP):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.http = http
+        self.pinned: List[FakeMessage] = []
+
+    def permissions_for(self, member) -> FakePermissions:
+        return FakePermissions()
+
+    async def send(self, content=None, embed=None, embeds=None, **kwargs) -> FakeMessage:
+        await self.http.request("send", "POST", f"/channels/{self.id}/messages")
+        return FakeMessage(self, content, embed, embeds)
+
+    def get_partial_message(self, message_id: int) -> FakeMessage:
+        return FakeMessage(self, message_id=message_id)
+
+    async def pins(self) -> List[FakeMessage]:
+        await self.http.request("pins", "GET", f"/channels/{self.id}/pins")
+        return list(self.pinned)
+
+    def __str__(self):
+        return self.name
+
+    def __repr__(self):
+        return f"<FakeTextChannel id={self.id} name={self.name!r}>"
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild: "FakeGuild", name: str, channel_id: Optional[int] = None):
+        self.id = channel_id or next_id()
+        self.guild = guild
+        self.name = name
+        self.category = None
+        self.members: List["FakeMember"] = []
+
+
+class FakeVoiceState:
+    def __init__(self, channel: Optional[FakeVoiceChannel]):
+        self.channel = channel
+
+
+class FakeMember:
+    def __init__(self, guild: "FakeGuild", member_id: Optional[int] = None, bot: bool = False):
+        self.id = member_id or next_id()
+        self.guild = guild
+        self.bot = bot
+        self.display_name = f"membro{self.id % 100000}"
+        self.mention = f"<@{self.id}>"
+        self.display_avatar = FakeAsset(self.id)
+        self.voice: Optional[FakeVoiceState] = None
+        self.roles = []
+
+
+class FakeGuild:
+    def __init__(self, http: FakeHTTP, name: str = "servidor"):
+        self.id = next_id()
+        self.name = name
+        self.http = http
+        self.me = FakeMember(self, bot=True)
+        self.members: Dict[int, FakeMember] = {}
+        self.channels: Dict[int, object] = {}
+        self.text_channels: List[FakeTextChannel] = []
+        self.voice_channels: List[FakeVoiceChannel] = []
+        self.system_channel: Optional[FakeTextChannel] = None
+
+    def add_text_channel(self, name: str) -> FakeTextChannel:
+        ch = FakeTextChannel(self, name, self.http)
+        self.channels[ch.id] = ch
+        self.text_channels.append(ch)
+        if self.system_channel is None:
+            self.system_channel = ch
+        return ch
+
+    def add_voice_channel(self, name: str) -> FakeVoiceChannel:
+        ch = FakeVoiceChannel(self, name)
+        self.channels[ch.id] = ch
+        self.voice_channels.append(ch)
+        return ch
+
+    def add_member(self) -> FakeMember:
+        member = FakeMember(self)
+        self.members[member.id] = member
+        return member
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    def get_member(self, member_id: int) -> Optional[FakeMember]:
+        return self.members.get(member_id)
+
+
+class FakeGateway:
+    """Entrega eventos de voz ao handler do bot e mede quanto cada um demora."""
+
+    def __init__(self, handler: Callable, clock: Callable[[], float]):
+        self.handler = handler
+        self.clock = clock
+        self.latencies: List[float] = []
+        self.events = 0
+
+    async def move(self, member: FakeMember, channel: Optional[FakeVoiceChannel]):
+        before = FakeVoiceState(member.voice.channel if member.voice else None)
+        if before.channel is not None and member in before.channel.members:
+            before.channel.members.remove(member)
+        after = FakeVoiceState(channel)
+        if channel is not None:
+            channel.members.append(member)
+        member.voice = after if channel is not None else None
+        start = self.clock()
+        await self.handler(member, before, after)
+        self.latencies.append(self.clock() - start)
+        self.events += 1
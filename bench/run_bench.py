@@ -0,0 +1,351 @@
+# bench/run_bench.py
+"""Simulação de carga offline do bot.py.
+
+Sobe o bot sem conectar ao Discord (ver fake_discord.py), faz N membros
+entrarem nos canais de voz configurados, mantém uma rotatividade de
+entradas/saídas e no fim todos saem. Mede:
+
+- latência da entrada no canal até a sessão existir em user_data (inclui a
+  janela de agrupamento) e até a mensagem inicial sair (inclui o orçamento
+  de envio do canal), p50/p95/p99/máx
+- tempo gasto no handler dos eventos de voz
+- edições e envios HTTP por segundo (e 429 recebidos)
+- atraso do event loop e atraso do agendador
+- memória por sessão ativa (tracemalloc durante a entrada)
+
+O resultado vai para bench/results/ e é comparado com bench/baseline.json
+(quando o cenário é o mesmo) para acusar regressões.
+
+Uso:
+    python bench/run_bench.py --members 1000 --channels 10 --duration 30
+    python bench/run_bench.py --members 10000 --dashboard --save-baseline
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+RESULTS_DIR = os.path.join(HERE, "results")
+BASELINE_PATH = os.path.join(HERE, "baseline.json")
+
+# métricas comparadas com o baseline: nome -> tolerância relativa (maior é pior)
+REGRESSION_CHECKS = {
+    "join_latency_ms.p95": 0.25,
+    "join_latency_ms.p99": 0.25,
+    "first_message_ms.p95": 0.25,
+    "first_message_ms.p99": 0.25,
+    "loop_lag_ms.p99": 0.25,
+    "scheduler_max_lateness_ms": 0.50,
+    "bytes_per_session": 0.10,
+    "http_per_second.edit": 0.10,
+    "http_per_second.send": 0.10,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark offline do PomoAllos com um Discord simulado")
+    parser.add_argument("--members", type=int, default=1000, help="membros simulados")
+    parser.add_argument("--channels", type=int, default=10, help="canais de anúncio (cada um com um canal Pomodoro e um de Cronômetro)")
+    parser.add_argument("--ramp", type=float, default=5.0, help="segundos para todos entrarem")
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos de regime com rotatividade")
+    parser.add_argument("--drain", type=float, default=15.0, help="segundos máximos esperando os eventos finais")
+    parser.add_argument("--churn", type=float, default=0.01, help="fração dos membros que sai e volta por segundo")
+    parser.add_argument("--stopwatch-share", type=float, default=0.3, help="fração dos membros no Cronômetro")
+    parser.add_argument("--focus", type=int, default=8, help="segundos de foco do perfil simulado")
+    parser.add_argument("--break", dest="break_", type=int, default=4, help="segundos de pausa do perfil simulado")
+    parser.add_argument("--pomodoro-interval", type=float, default=10)
+    parser.add_argument("--stopwatch-interval", type=float, default=1)
+    parser.add_argument("--latency", default="0.03,0.12", help="latência HTTP simulada mín,máx (s)")
+    parser.add_argument("--rate-limit", type=float, default=0.01, help="chance de 429 por chamada HTTP")
+    parser.add_argument("--dashboard", action="store_true", help="usa o modo painel")
+    parser.add_argument("--shared-rooms", action="store_true", help="perfis Pomodoro em sala compartilhada")
+    parser.add_argument("--relative-timestamps", action="store_true",
+                        help="progresso com horários do Discord (edita só nas trocas de fase)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--name", default=None, help="nome do cenário (padrão: derivado dos parâmetros)")
+    parser.add_argument("--save-baseline", action="store_true", help="grava o resultado como baseline")
+    parser.add_argument("--fail-on-regression", action="store_true", help="sai com código 1 se houver regressão")
+    return parser.parse_args(argv)
+
+
+def percentiles(samples, scale=1.0):
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0, "count": 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * scale, 3)
+
+    return {"p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99), "max": round(ordered[-1] * scale, 3),
+            "count": len(ordered)}
+
+
+def scenario_name(args) -> str:
+    if args.name:
+        return args.name
+    mode = "dashboard" if args.dashboard else "messages"
+    if args.shared_rooms:
+        mode += "-rooms"
+    if args.relative_timestamps:
+        mode += "-timestamps"
+    return f"{args.members}m-{args.channels}c-{mode}"
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecida"
+
+
+def load_bot(args, workdir: str):
+    """Importa o bot.py com banco e roteamento temporários."""
+    os.environ["SESSION_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["ROUTING_CONFIG_PATH"] = os.path.join(workdir, "channels.json")
+    os.environ["DASHBOARD_MODE"] = "1" if args.dashboard else "0"
+    os.environ["METRICS_PORT"] = "0"
+    sys.path.insert(0, ROOT)
+    import bot  # noqa: E402 — precisa das variáveis de ambiente acima
+    return bot
+
+
+async def lag_probe(samples, interval=0.05):
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - start - interval))
+
+
+async def run(args) -> dict:
+    from fake_discord import FakeGateway, FakeGuild, FakeHTTP
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="pomoallos-bench-")
+    bot = load_bot(args, workdir)
+    loop = asyncio.get_running_loop()
+
+    low, high = (float(x) for x in args.latency.split(","))
+    http = FakeHTTP(latency=(low, high), rate_limit_chance=args.rate_limit, seed=args.seed)
+    guild = FakeGuild(http)
+
+    # um canal de anúncio por par de canais de voz, cada par com seu perfil
+    profiles, channels, rooms = {}, {}, []
+    for i in range(args.channels):
+        text = guild.add_text_channel(f"estudos-{i}")
+        pomodoro = guild.add_voice_channel(f"pomodoro-{i}")
+        stopwatch = guild.add_voice_channel(f"cronometro-{i}")
+        profiles[f"p{i}"] = {"mode": "pomodoro", "focus_seconds": args.focus, "break_seconds": args.break_,
+                             "update_interval": args.pomodoro_interval, "announce_channel_id": text.id,
+                             "shared_room": args.shared_rooms, "relative_timestamps": args.relative_timestamps}
+        profiles[f"s{i}"] = {"mode": "stopwatch", "update_interval": args.stopwatch_interval,
+                             "announce_channel_id": text.id, "relative_timestamps": args.relative_timestamps}
+        channels[str(pomodoro.id)] = f"p{i}"
+        channels[str(stopwatch.id)] = f"s{i}"
+        rooms.append((pomodoro, stopwatch))
+    bot.routing = bot.RoutingTable.from_dict({"profiles": profiles, "channels": channels})
+    bot.bot.get_guild = lambda guild_id: guild if guild_id == guild.id else None
+    bot.bot.get_channel = guild.get_channel
+
+    # os avisos de 429 do HTTP simulado só alimentam o dispatcher (ver watch_rate_limits)
+    logging.getLogger("discord.http").setLevel(logging.ERROR)
+    await bot.setup_hook()
+    lag_samples = []
+    probe = asyncio.create_task(lag_probe(lag_samples))
+
+    gateway = FakeGateway(bot.on_voice_state_update, loop.time)
+    events = set()
+
+    # o handler só agenda a troca: a latência que importa é do evento até a
+    # sessão existir (track_session) e até a mensagem inicial sair (primeiro persist_session)
+    joined_at, waiting_message = {}, {}
+    session_latencies, message_latencies = [], []
+    track_session, persist_session = bot.track_session, bot.persist_session
+
+    def tracked(data):
+        track_session(data)
+        start = joined_at.pop(data.member_id, None)
+        if start is not None:
+            session_latencies.append(loop.time() - start)
+            waiting_message[data.member_id] = start
+
+    def persisted(member_id, data):
+        persist_session(member_id, data)
+        start = waiting_message.pop(member_id, None)
+        if start is not None:
+            message_latencies.append(loop.time() - start)
+
+    bot.track_session, bot.persist_session = tracked, persisted
+
+    def dispatch(member, channel):
+        if channel is not None:
+            joined_at[member.id] = loop.time()
+        else:
+            joined_at.pop(member.id, None)
+            waiting_message.pop(member.id, None)
+        # o discord.py trata cada evento do gateway numa task própria
+        task = asyncio.create_task(gateway.move(member, channel))
+        events.add(task)
+        task.add_done_callback(events.discard)
+
+    members = [guild.add_member() for _ in range(args.members)]
+    homes = {}
+    for member in members:
+        pomodoro, stopwatch = rng.choice(rooms)
+        homes[member.id] = stopwatch if rng.random() < args.stopwatch_share else pomodoro
+
+    # --- entrada (com tracemalloc para medir memória por sessão) ---
+    tracemalloc.start()
+    mem_before = tracemalloc.get_traced_memory()[0]
+    step = args.ramp / max(1, len(members))
+    ramp_start = loop.time()
+    for i, member in enumerate(members):
+        delay = ramp_start + i * step - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        dispatch(member, homes[member.id])
+    settle_deadline = loop.time() + args.drain
+    # os eventos só agendam a troca; a sessão começa depois da janela de agrupamento
+    while (events or bot.pending_voice) and loop.time() < settle_deadline:
+        await asyncio.sleep(0.05)
+    active = len(bot.user_data)
+    mem_after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # --- regime: rotatividade e medição de taxas ---
+    lag_samples.clear()
+    bot.scheduler.max_lateness = 0.0
+    counts_before = dict(http.counts)
+    limited_before = http.rate_limited
+    observed_before = bot.dispatcher.rate_limited
+    steady_start = loop.time()
+    away = []
+    while loop.time() - steady_start < args.duration:
+        for member in away:
+            dispatch(member, homes[member.id])
+        k = int(args.members * args.churn)
+        away = rng.sample(members, k) if k else []
+        for member in away:
+            dispatch(member, None)
+        await asyncio.sleep(1.0)
+    steady_elapsed = loop.time() - steady_start
+    steady_counts = {route: http.counts.get(route, 0) - counts_before.get(route, 0) for route in http.counts}
+    steady_lag = list(lag_samples)
+    messages_pending = len(waiting_message)  # sessões ainda sem mensagem inicial ao fim do regime
+    lateness = bot.scheduler.max_lateness
+
+    # --- saída de todos ---
+    for member in members:
+        if member.voice is not None:
+            dispatch(member, None)
+    drain_deadline = loop.time() + args.drain
+    while (events or bot.pending_voice) and loop.time() < drain_deadline:
+        await asyncio.sleep(0.05)
+    backlog = len(events)
+    for task in list(events):
+        task.cancel()
+
+    probe.cancel()
+    await bot.scheduler.stop()
+    await bot.dispatcher.stop()
+    bot.store.close()
+
+    dispatcher_stats = bot.dispatcher.stats()
+    return {
+        "scenario": scenario_name(args),
+        "params": {k: v for k, v in vars(args).items() if k not in ("save_baseline", "fail_on_regression", "name")},
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "metrics": {
+            "active_sessions": active,
+            "bytes_per_session": int((mem_after - mem_before) / active) if active else 0,
+            "join_latency_ms": percentiles(session_latencies, 1000),
+            "first_message_ms": percentiles(message_latencies, 1000),
+            "first_messages_pending": messages_pending,
+            "handler_latency_ms": percentiles(gateway.latencies, 1000),
+            "events_backlog": backlog,
+            "loop_lag_ms": percentiles(steady_lag, 1000),
+            "scheduler_max_lateness_ms": round(lateness * 1000, 3),
+            "http_per_second": {route: round(n / steady_elapsed, 3) for route, n in sorted(steady_counts.items())},
+            "http_429_per_second": round((http.rate_limited - limited_before) / steady_elapsed, 3),
+            # o que o dispatcher contou pelo aviso do discord.py; deve bater com o anterior
+            "observed_429_per_second": round((bot.dispatcher.rate_limited - observed_before) / steady_elapsed, 3),
+            "frames_dropped": dispatcher_stats["dropped"],
+            "edits_suppressed": bot.render_stats["suppressed"],
+            "edit_queue_wait_ms": {k: round(dispatcher_stats[k] * 1000, 3) for k in ("wait_p50", "wait_p95", "wait_max")},
+        },
+    }
+
+
+def lookup(metrics: dict, dotted: str):
+    value = metrics
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare(result: dict, baseline: dict):
+    """Lista de (métrica, baseline, atual) que pioraram além da tolerância."""
+    regressions = []
+    for metric, tolerance in REGRESSION_CHECKS.items():
+        old = lookup(baseline["metrics"], metric)
+        new = lookup(result["metrics"], metric)
+        if old is None or new is None:
+            continue
+        if new > old * (1 + tolerance) and new - old > 1e-3:
+            regressions.append((metric, old, new))
+    return regressions
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    sys.path.insert(0, HERE)
+    result = asyncio.run(run(args))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    out_path = os.path.join(RESULTS_DIR, f"{result['scenario']}-{stamp}.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(result["metrics"], indent=2))
+    print(f"Resultado salvo em {out_path}")
+
+    baselines = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baselines = json.load(f)
+
+    status = 0
+    baseline = baselines.get(result["scenario"])
+    if baseline is not None:
+        regressions = compare(result, baseline)
+        for metric, old, new in regressions:
+            print(f"REGRESSÃO {metric}: {old} -> {new} (baseline {baseline['revision']})")
+        if not regressions:
+            print(f"Sem regressões em relação ao baseline {baseline['revision']}")
+        elif args.fail_on_regression:
+            status = 1
+
+    if args.save_baseline:
+        baselines[result["scenario"]] = result
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baseline de '{result['scenario']}' atualizado")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
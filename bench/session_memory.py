@@ -0,0 +1,188 @@
+# bench/session_memory.py
+"""Memória retida por sessão ativa: registro antigo (dict) x Session.
+
+Monta objetos reais do discord.py (ConnectionState offline, sem conexão) e
+cria N sessões em cada formato:
+
+- legado: o dict que o bot.py guardava antes, com o discord.Member, o
+  TextChannel e a discord.Message devolvida pelo envio da mensagem inicial;
+- compacto: session.Session, só com IDs e horários (a Message é descartada
+  depois de lido o ID, como no bot.py atual).
+
+Os membros e o canal já estão no cache do cliente nos dois casos, então a
+medição é o que cada sessão mantém vivo a mais. Também mede o que continua
+retido depois que os membros saem do servidor (o cache do cliente os solta,
+mas o dict legado não).
+
+Uso:
+    python bench/session_memory.py --sessions 10000
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+import discord
+from discord.state import ConnectionState
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from routing import ModeProfile  # noqa: E402
+from session import Session  # noqa: E402
+
+GUILD_ID = 10
+CHANNEL_ID = 20
+VOICE_ID = 30
+BOT_ID = 1
+PROFILE = ModeProfile(name="pomodoro", mode="pomodoro", announce_channel_id=CHANNEL_ID, update_interval=10)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bytes por sessão: dict legado x Session")
+    parser.add_argument("--sessions", type=int, default=5000, help="sessões criadas em cada formato")
+    return parser.parse_args(argv)
+
+
+def user_payload(user_id: int, name: str) -> dict:
+    return {"id": str(user_id), "username": name, "discriminator": "0", "avatar": None, "global_name": name}
+
+
+def make_state(loop) -> ConnectionState:
+    intents = discord.Intents.default()
+    intents.members = True
+    http = discord.http.HTTPClient(loop)
+    state = ConnectionState(dispatch=lambda *a, **kw: None, handlers={}, hooks={}, http=http,
+                            intents=intents, max_messages=1000)
+    state.user = discord.ClientUser(state=state, data=user_payload(BOT_ID, "PomoAllos"))
+    return state
+
+
+def make_guild(state: ConnectionState, members: int) -> discord.Guild:
+    everyone = {"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                "hoist": False, "managed": False, "mentionable": False}
+    data = {
+        "id": str(GUILD_ID), "name": "servidor", "owner_id": str(BOT_ID), "features": [], "emojis": [],
+        "stickers": [], "premium_tier": 0, "roles": [everyone], "member_count": members,
+        "channels": [
+            {"id": str(CHANNEL_ID), "type": 0, "name": "estudos", "position": 0, "permission_overwrites": []},
+            {"id": str(VOICE_ID), "type": 2, "name": "pomodoro", "position": 1, "permission_overwrites": [],
+             "bitrate": 64000, "user_limit": 0},
+        ],
+        "members": [
+            {"user": user_payload(BOT_ID + 1 + i, f"membro{i}"), "roles": [], "joined_at": "2025-01-01T00:00:00+00:00",
+             "deaf": False, "mute": False, "flags": 0}
+            for i in range(members)
+        ],
+    }
+    guild = discord.Guild(data=data, state=state)
+    state._add_guild(guild)
+    return guild
+
+
+def sent_message(state: ConnectionState, channel: discord.TextChannel, member: discord.Member, seq: int) -> discord.Message:
+    """A discord.Message que o channel.send da mensagem inicial devolveria."""
+    embed = discord.Embed(
+        title="PomoAllos — 📚 Sessão de Foco Iniciada",
+        description=f"Continue firme, {member.display_name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!",
+        color=0x0055AA,
+    ).set_thumbnail(url=str(member.display_avatar.url)).set_footer(text="Pomodoro em andamento")
+    data = {
+        "id": str(10 ** 15 + seq), "channel_id": str(CHANNEL_ID), "guild_id": str(GUILD_ID),
+        "author": dict(user_payload(BOT_ID, "PomoAllos"), bot=True), "content": member.mention,
+        "timestamp": "2026-01-01T12:00:00.000000+00:00", "edited_timestamp": None, "tts": False,
+        "mention_everyone": False, "mentions": [user_payload(member.id, member.name)], "mention_roles": [],
+        "attachments": [], "embeds": [embed.to_dict()], "pinned": False, "type": 0,
+    }
+    message = discord.Message(state=state, channel=channel, data=data)
+    state._messages.append(message)  # o cache do cliente, como no envio real
+    return message
+
+
+def legacy_session(state, channel, voice, member, seq, now) -> dict:
+    return {
+        "start_time": datetime.datetime.utcnow(),
+        "focused_seconds": 0,
+        "mode": "pomodoro",
+        "voice_channel": voice.id,
+        "cycle_phase": "focus",
+        "phase_start": now,
+        "phase_end": now + PROFILE.focus_seconds,
+        "profile": PROFILE,
+        "member": member,
+        "announce": channel,
+        "message": sent_message(state, channel, member, seq),
+    }
+
+
+def compact_session(state, channel, voice, member, seq, now) -> Session:
+    data = Session(
+        member_id=member.id, guild_id=member.guild.id, profile=PROFILE, voice_channel_id=voice.id,
+        announce_channel_id=channel.id, start_time=now, phase_start=now,
+    )
+    data.cycle_phase = "focus"
+    data.phase_end = now + PROFILE.focus_seconds
+    data.message_id = sent_message(state, channel, member, seq).id
+    return data
+
+
+def traced() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+async def measure(build, count: int) -> dict:
+    state = make_state(asyncio.get_running_loop())
+    now = 1000.0
+
+    tracemalloc.start()
+    try:
+        empty = traced()
+        guild = make_guild(state, count)
+        channel = guild.get_channel(CHANNEL_ID)
+        voice = guild.get_channel(VOICE_ID)
+        members = [m for m in guild.members if m.id != BOT_ID]
+        base = traced()
+        sessions = {m.id: build(state, channel, voice, m, i, now) for i, m in enumerate(members)}
+        state._messages.clear()  # mensagens antigas saem do cache; só fica o que a sessão segura
+        active = traced() - base
+
+        # todos saem do servidor: o cache do cliente solta os membros; o que
+        # sobra acima do servidor vazio é o que as sessões ainda seguram
+        for member in members:
+            guild._remove_member(member)
+        del members
+        left = traced() - empty
+        del sessions
+    finally:
+        tracemalloc.stop()
+        await state.http.close()
+    return {
+        "bytes_per_session": int(active / count),
+        "bytes_retained_after_members_left": int(left / count),
+    }
+
+
+async def run(args) -> dict:
+    legacy = await measure(legacy_session, args.sessions)
+    compact = await measure(compact_session, args.sessions)
+    return {
+        "sessions": args.sessions,
+        "legacy_dict": legacy,
+        "session_slots": compact,
+        "reduction": round(1 - compact["bytes_per_session"] / legacy["bytes_per_session"], 3),
+    }
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
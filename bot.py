@@ -2,11 +2,27 @@
 import discord
 from discord.ext import commands
 import asyncio
-import datetime
+import collections
+import io
+import logging
 import os
+import re
+import socket
+import tempfile
+import time
 from typing import Optional
 from dotenv import load_dotenv
 
+from edit_queue import EditDispatcher
+from history_io import ChunkedExport, day_range, format_from_name, read_history
+from log_queue import setup_logging
+from metrics import Counter, Gauge, LoopLagMonitor, MetricsServer, Registry
+from routing import ModeProfile, RoutingError, RoutingTable
+from scheduler import TickScheduler
+from session import Room, Session
+from session_index import SessionIndex
+from session_store import open_backend, shard_of
+
 load_dotenv() # Carrega as variáveis do arquivo .env
 
 TOKEN = os.getenv('DISCORD_TOKEN')
@@ -29,6 +45,62 @@ POMODORO_BREAK = 5 * 60
 # Intervals
 POMODORO_UPDATE_INTERVAL = 10   # atualiza a cada 10s durante Pomodoro
 STOPWATCH_UPDATE_INTERVAL = 1   # atualiza a cada 1s no cronômetro
+DASHBOARD_UPDATE_INTERVAL = 5   # atualiza o painel a cada 5s (uma edição por canal)
+
+# Painel: em vez de uma mensagem de progresso por membro, cada canal de anúncio
+# mantém uma única mensagem fixada listando todas as sessões ativas
+DASHBOARD_MODE = os.getenv("DASHBOARD_MODE", "0") == "1"
+
+# Roteamento canal de voz -> perfil (ver routing.py / channels.example.json).
+# Sem o arquivo, usa os dois canais e tempos acima. Recarregado sem reiniciar
+# pelo !reload ou quando o arquivo muda (checado a cada ROUTING_POLL_INTERVAL).
+ROUTING_CONFIG_PATH = os.getenv("ROUTING_CONFIG_PATH", "channels.json")
+ROUTING_POLL_INTERVAL = 30
+
+# Persistência das sessões (SQLite) — gravada em lote a cada STORE_FLUSH_INTERVAL.
+# SESSION_BACKEND_URL troca o backend (ver session_store.open_backend); com
+# vários processos todos apontam para o mesmo.
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "pomoallos.db")
+SESSION_BACKEND_URL = os.getenv("SESSION_BACKEND_URL") or f"sqlite:///{SESSION_DB_PATH}"
+STORE_FLUSH_INTERVAL = 15
+STATS_UTC_OFFSET_HOURS = -3  # fuso usado para fechar dia/semana/mês das estatísticas (Brasília)
+
+# Sharding: sem SHARD_COUNT, um único processo com commands.Bot. SHARD_COUNT=auto
+# usa o AutoShardedBot com a contagem recomendada pelo Discord, tudo neste
+# processo. SHARD_COUNT=N com SHARD_IDS=0,1 divide entre processos: cada um roda
+# os shards listados e é dono das sessões dos servidores desses shards.
+SHARD_COUNT = os.getenv("SHARD_COUNT", "").strip().lower()
+SHARD_IDS = [int(x) for x in os.getenv("SHARD_IDS", "").split(",") if x.strip()] or None
+if SHARD_IDS is not None and not SHARD_COUNT.isdigit():
+    # sem a contagem, cada processo rodaria todos os shards e adotaria as sessões dos outros
+    raise SystemExit("SHARD_IDS exige SHARD_COUNT com o número total de shards")
+if SHARD_IDS is not None and any(not 0 <= i < int(SHARD_COUNT) for i in SHARD_IDS):
+    raise SystemExit(f"SHARD_IDS fora do intervalo 0..{int(SHARD_COUNT) - 1}")
+PROCESS_ID = os.getenv("PROCESS_ID") or f"{socket.gethostname()}:{os.getpid()}"
+CLUSTER_ALIVE_WINDOW = 3 * STORE_FLUSH_INTERVAL  # processo sem batimento há mais que isso some do !status
+
+# Eventos de voz do mesmo membro são agrupados: aplica-se só o canal final depois
+# de VOICE_DEBOUNCE segundos sem eventos novos (no máximo VOICE_DEBOUNCE_MAX após o primeiro)
+VOICE_DEBOUNCE = 2.0
+VOICE_DEBOUNCE_MAX = 10.0
+
+# Na subida (e depois de um RESUME) quem já está nos canais de voz ganha sessão
+# em lote; as mensagens iniciais saem espaçadas por canal de anúncio, um pouco
+# abaixo do SEND_RATE do dispatcher, para sobrar espaço a quem entra ao vivo
+RECONCILE_SPACING = 1.25
+
+# Anúncios de troca de fase e fim de sessão que vencem dentro desta janela saem
+# juntos, numa mensagem por canal (até 10 embeds); perfis com
+# "batch_announcements": false continuam com uma mensagem por anúncio
+ANNOUNCE_BATCH_WINDOW = 2.0
+
+# Logs com nível (DEBUG, INFO, WARNING...) escritos por uma thread à parte (ver log_queue.py)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+DISCORD_LOG_LEVEL = os.getenv("DISCORD_LOG_LEVEL") or None
+
+# Métricas no formato do Prometheus em http://METRICS_HOST:METRICS_PORT/metrics (porta 0 desliga)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
 
 BOT_DISPLAY_NAME = "PomoAllos"
 # -----------------------------------
@@ -38,11 +110,105 @@ intents.voice_states = True
 intents.guilds = True
 intents.guild_messages = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+if SHARD_COUNT == "auto":
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents)
+elif SHARD_COUNT:
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents,
+                                  shard_count=int(SHARD_COUNT), shard_ids=SHARD_IDS)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
+log = logging.getLogger("pomoallos")
 
 # controle de sessões ativas
-user_tasks = {}   # member.id -> asyncio.Task
-user_data = {}    # member.id -> dict com info (start_time, focused_seconds, mode, message, ...)
+user_data = {}    # member.id -> Session (só IDs e horários; ver session.py)
+rooms = {}        # voice_channel.id -> Room (salas com ciclo compartilhado)
+session_index = SessionIndex()  # user_data por servidor/modo/canal, em ordem de início (ver track_session)
+scheduler = TickScheduler()  # deadlines de todas as sessões (member.id -> próximo tick)
+dispatcher = EditDispatcher()  # edições/envios com orçamento por canal (último frame vence)
+store = open_backend(SESSION_BACKEND_URL, utc_offset_hours=STATS_UTC_OFFSET_HOURS,
+                     owner_id=PROCESS_ID)  # cópia durável de user_data (write-behind), compartilhada entre processos
+stored_dashboards = {}  # announce_channel.id -> message.id do painel salvo
+sessions_recovered = False
+pending_voice = {}  # member.id -> {"member", "channel", "left_at", "joined_at"} da rajada em andamento
+pending_announcements = {}  # announce_channel.id -> [(menção, embed)] aguardando a janela
+background_tasks = set()  # anúncios de fim de sessão em andamento (referência forte até terminarem)
+history_jobs = set()  # guild.id com !export/!import em andamento (um por servidor)
+
+# --- roteamento ---
+DEFAULT_PROFILES = {
+    "pomodoro": ModeProfile(
+        name="pomodoro", mode="pomodoro", announce_channel_id=POMODORO_ANNOUNCE_CHANNEL_ID,
+        update_interval=POMODORO_UPDATE_INTERVAL, focus_seconds=POMODORO_FOCUS, break_seconds=POMODORO_BREAK,
+    ),
+    "stopwatch": ModeProfile(
+        name="stopwatch", mode="stopwatch", announce_channel_id=STOPWATCH_ANNOUNCE_CHANNEL_ID,
+        update_interval=STOPWATCH_UPDATE_INTERVAL,
+    ),
+}
+
+def load_routing() -> RoutingTable:
+    """Lê o arquivo de roteamento; sem arquivo, usa os canais padrão"""
+    if os.path.exists(ROUTING_CONFIG_PATH):
+        return RoutingTable.load(ROUTING_CONFIG_PATH)
+    return RoutingTable(
+        {POMODORO_VOICE_ID: DEFAULT_PROFILES["pomodoro"], STOPWATCH_VOICE_ID: DEFAULT_PROFILES["stopwatch"]},
+        dict(DEFAULT_PROFILES),
+        path=ROUTING_CONFIG_PATH,
+    )
+
+routing = load_routing()  # voice_channel.id -> ModeProfile
+
+# --- métricas ---
+# Quase tudo é lido dos contadores que já existem na hora da coleta; no caminho
+# quente ficam só os histogramas (dispatcher/agendador) e o contador de eventos.
+metrics = Registry()
+loop_lag = LoopLagMonitor()
+metrics_server = MetricsServer(metrics, METRICS_HOST, METRICS_PORT)
+voice_events = metrics.register(Counter(
+    "pomoallos_voice_events_total", "Eventos de voz em canais configurados"))
+reconciled = metrics.register(Counter(
+    "pomoallos_reconciled_sessions_total", "Sessões iniciadas/encerradas pela reconciliação dos canais de voz",
+    ("action",)))
+announcements = metrics.register(Counter(
+    "pomoallos_announcements_total", "Anúncios de fase/fim de sessão, por forma de entrega", ("delivery",)))
+history_rows = metrics.register(Counter(
+    "pomoallos_history_rows_total", "Sessões do histórico exportadas/importadas pelo !export/!import",
+    ("direction",)))
+
+def _active_sessions():
+    counts = collections.Counter(data.mode for data in user_data.values())
+    return [((mode,), counts.get(mode, 0)) for mode in ("pomodoro", "stopwatch")]
+
+def _channel_counter(attr: str):
+    return lambda: [((str(cid),), getattr(st, attr)) for cid, st in dispatcher.channels.items()]
+
+metrics.register(Gauge("pomoallos_active_sessions", "Sessões ativas por modo", ("mode",), collect=_active_sessions))
+metrics.register(Gauge("pomoallos_active_rooms", "Salas com ciclo compartilhado ativas",
+                       collect=lambda: [((), len(rooms))]))
+metrics.register(Gauge("pomoallos_pending_voice_changes", "Membros com troca de canal aguardando a janela de agrupamento",
+                       collect=lambda: [((), len(pending_voice))]))
+metrics.register(Counter("pomoallos_channel_edits_total", "Edições de mensagem enviadas por canal",
+                         ("channel",), collect=_channel_counter("edits")))
+metrics.register(Counter("pomoallos_channel_sends_total", "Mensagens novas enviadas por canal",
+                         ("channel",), collect=_channel_counter("sends")))
+# os 429 vêm do aviso do discord.py, que repete a chamada sozinho (ver edit_queue.watch_rate_limits)
+metrics.register(Counter("pomoallos_channel_rate_limited_total", "Respostas 429 recebidas por canal",
+                         ("channel",), collect=_channel_counter("rate_limited")))
+metrics.register(Counter("pomoallos_global_rate_limited_total", "Vezes que o limite global da API foi atingido",
+                         collect=lambda: [((), dispatcher.global_rate_limited)]))
+metrics.register(Counter("pomoallos_channel_frames_dropped_total", "Frames de edição substituídos antes de sair, por canal",
+                         ("channel",), collect=_channel_counter("dropped")))
+metrics.register(Gauge("pomoallos_edit_queue_pending", "Frames de edição aguardando orçamento",
+                       collect=lambda: [((), dispatcher.pending_count())]))
+metrics.register(Gauge("pomoallos_scheduler_entries", "Deadlines pendentes no agendador",
+                       collect=lambda: [((), len(scheduler))]))
+metrics.register(Gauge("pomoallos_event_loop_lag_last_seconds", "Último atraso medido do event loop",
+                       collect=lambda: [((), loop_lag.last)]))
+
+@metrics.collector
+def _runtime_histograms():
+    # lidos do objeto atual (o benchmark troca o dispatcher depois do import)
+    return (dispatcher.latency, dispatcher.queue_wait, scheduler.lateness, loop_lag.histogram)
 
 # --- utilitários ---
 def make_embed(title: str, description: str, color: int, member: Optional[discord.Member] = None, footer_text: Optional[str] = None):
@@ -61,385 +227,1629 @@ def fmt_hms(total_seconds: int):
     s = total_seconds % 60
     return f"{m}m {s}s"
 
+# As sessões guardam só IDs; membro e canal saem do cache do cliente quando preciso
+def session_member(data: Session) -> Optional[discord.Member]:
+    guild = bot.get_guild(data.guild_id)
+    return guild.get_member(data.member_id) if guild else None
+
+def member_name(data: Session, member: Optional[discord.Member]) -> str:
+    return member.display_name if member else data.mention
+
+# Marcações de horário do Discord (perfis com relative_timestamps)
+def discord_timestamp(epoch: float, style: str) -> str:
+    """Marcação de horário que cada cliente do Discord exibe e atualiza sozinho (R = relativo, T = hora)"""
+    return f"<t:{int(epoch)}:{style}>"
+
+def timestamp_lines(data: Session) -> str:
+    """Fim da fase e início da sessão em marcação do Discord (modo relative_timestamps)"""
+    lines = []
+    if data.phase_end is not None:
+        end = mono_to_epoch(data.phase_end)
+        label = "Foco" if data.cycle_phase == "focus" else "Pausa"
+        lines.append(f"⏳ {label} termina {discord_timestamp(end, 'R')} (às {discord_timestamp(end, 'T')})")
+    lines.append(f"🕒 Sessão iniciada {discord_timestamp(data.start_time, 'R')} "
+                 f"(às {discord_timestamp(data.start_time, 'T')})")
+    return "\n".join(lines)
+
+# Cache da resolução do canal de anúncio: guild.id -> {channel_id configurado -> id resolvido (ou None)}
+# Invalidado pelos eventos de canal/cargo/permissão abaixo.
+announce_cache = {}
+announce_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+def invalidate_announcement_cache(guild_id: int):
+    if announce_cache.pop(guild_id, None) is not None:
+        announce_cache_stats["invalidations"] += 1
+
 def get_announcement_channel(guild: discord.Guild, channel_id: int) -> Optional[discord.TextChannel]:
+    """Get the announcement channel for `channel_id`, resolving it only on a cache miss"""
+    cached = announce_cache.get(guild.id)
+    if cached is not None and channel_id in cached:
+        resolved_id = cached[channel_id]
+        ch = guild.get_channel(resolved_id) if resolved_id is not None else None
+        if resolved_id is None or ch is not None:
+            announce_cache_stats["hits"] += 1
+            return ch
+
+    announce_cache_stats["misses"] += 1
+    ch = resolve_announcement_channel(guild, channel_id)
+    announce_cache.setdefault(guild.id, {})[channel_id] = ch.id if ch else None
+    return ch
+
+def resolve_announcement_channel(guild: discord.Guild, channel_id: int) -> Optional[discord.TextChannel]:
     """Get the text channel for announcements - try the channel ID first, then find a suitable text channel"""
     # First try the exact channel ID if it's a text channel
     ch = guild.get_channel(channel_id)
-    print(f"DEBUG: Channel {channel_id} found: {ch}, type: {type(ch)}")
-    
+    log.debug("Channel %s found: %s, type: %s", channel_id, ch, type(ch))
+
     if ch and isinstance(ch, discord.TextChannel):
-        print(f"DEBUG: Using specified text channel: {ch.name}")
+        log.debug("Using specified text channel: %s", ch.name)
         return ch
-    
+
     # If the channel ID points to a voice channel, look for a text channel in the same category
     if ch and hasattr(ch, 'category') and ch.category:
         for text_ch in ch.category.text_channels:
             if text_ch.permissions_for(guild.me).send_messages:
-                print(f"DEBUG: Using text channel from same category: {text_ch.name}")
+                log.debug("Using text channel from same category: %s", text_ch.name)
                 return text_ch
-    
+
     # Fallback to system channel or first available text channel
     if guild.system_channel and guild.system_channel.permissions_for(guild.me).send_messages:
-        print(f"DEBUG: Using system channel: {guild.system_channel.name}")
+        log.debug("Using system channel: %s", guild.system_channel.name)
         return guild.system_channel
-    
+
     # Last resort: find any text channel where bot can send messages
     for text_ch in guild.text_channels:
         if text_ch.permissions_for(guild.me).send_messages:
-            print(f"DEBUG: Using fallback text channel: {text_ch.name}")
+            log.debug("Using fallback text channel: %s", text_ch.name)
             return text_ch
-    
-    print("DEBUG: No suitable text channel found")
+
+    log.warning("No suitable text channel found in %s", guild.name)
     return None
 
 # --- eventos ---
+@bot.event
+async def setup_hook():
+    scheduler.start()
+    dispatcher.start()
+    dispatcher.watch_rate_limits(logging.getLogger("discord.http"))
+    loop_lag.start()
+    if METRICS_PORT:
+        try:
+            await metrics_server.start()
+            log.info("Métricas em http://%s:%d/metrics", METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            log.warning("Não foi possível abrir o endpoint de métricas: %s", e)
+    store.open()
+    stored_dashboards.update(await asyncio.to_thread(store.load_dashboards))
+    scheduler.schedule_in("session-store", STORE_FLUSH_INTERVAL, store_flush_tick)
+    scheduler.schedule_in("routing-reload", ROUTING_POLL_INTERVAL, routing_poll_tick)
+
 @bot.event
 async def on_ready():
-    print(f"{bot.user} online — {BOT_DISPLAY_NAME} pronto!")
+    global sessions_recovered
+    log.info("%s online — %s pronto!", bot.user, BOT_DISPLAY_NAME)
+    if not sessions_recovered:
+        sessions_recovered = True
+        await recover_sessions()
+    # também roda num novo on_ready (reconexão com IDENTIFY): eventos da queda se perderam
+    reconcile_voice_channels("ready")
+
+@bot.event
+async def on_resumed():
+    reconcile_voice_channels("resumed")
+
+@bot.event
+async def on_guild_available(guild):
+    # servidor que estava fora do ar na recuperação (ou voltou depois de uma queda)
+    if sessions_recovered:
+        reconcile_voice_channels("guild available", guild)
+
+# Qualquer mudança de canal, cargo ou permissão pode mudar o canal de anúncio resolvido
+@bot.event
+async def on_guild_channel_create(channel):
+    invalidate_announcement_cache(channel.guild.id)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    invalidate_announcement_cache(channel.guild.id)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    invalidate_announcement_cache(after.guild.id)
+
+@bot.event
+async def on_guild_role_create(role):
+    invalidate_announcement_cache(role.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    invalidate_announcement_cache(role.guild.id)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    invalidate_announcement_cache(after.guild.id)
+
+@bot.event
+async def on_member_update(before, after):
+    # cargos do próprio bot mudaram -> permissões mudaram
+    if after.id == bot.user.id and before.roles != after.roles:
+        invalidate_announcement_cache(after.guild.id)
+
+@bot.event
+async def on_guild_update(before, after):
+    # ex.: canal de sistema alterado
+    invalidate_announcement_cache(after.id)
+
+@bot.event
+async def on_guild_remove(guild):
+    invalidate_announcement_cache(guild.id)
 
 @bot.event
 async def on_voice_state_update(member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+    before_id = before.channel.id if before.channel else None
+    after_id = after.channel.id if after.channel else None
+    # Mute/deafen/stream não mudam de canal
+    if before_id == after_id:
+        return
+    # Uma consulta no dict por evento: tráfego de canais não configurados para aqui
+    before_profile = routing.routes.get(before_id)
+    after_profile = routing.routes.get(after_id)
+    # a sessão em curso segue valendo mesmo que uma recarga tenha tirado o canal da configuração
+    if before_profile is None and after_profile is None and member.id not in user_data:
+        return
     # Ignora bots
     if member.bot:
         return
 
-    before_id = before.channel.id if before.channel else None
-    after_id = after.channel.id if after.channel else None
-    
-    print(f"DEBUG: Voice state update - {member.display_name}")
-    print(f"DEBUG: Before channel: {before_id}, After channel: {after_id}")
-    print(f"DEBUG: Pomodoro channel ID: {POMODORO_VOICE_ID}")
-    print(f"DEBUG: Stopwatch channel ID: {STOPWATCH_VOICE_ID}")
-
-    # Entrou no canal Pomodoro
-    if after_id == POMODORO_VOICE_ID and before_id != POMODORO_VOICE_ID:
-        if member.id in user_tasks:
-            await stop_session(member, reason="mudou de canal")
-        await start_pomodoro(member, after.channel)
-
-    # Saiu do canal Pomodoro
-    if before_id == POMODORO_VOICE_ID and after_id != POMODORO_VOICE_ID:
-        if member.id in user_tasks and user_data.get(member.id, {}).get("mode") == "pomodoro":
-            await stop_session(member, reason="saiu do canal")
-
-    # Entrou no canal Cronômetro (stopwatch)
-    if after_id == STOPWATCH_VOICE_ID and before_id != STOPWATCH_VOICE_ID:
-        if member.id in user_tasks:
-            await stop_session(member, reason="mudou de canal")
-        await start_stopwatch(member, after.channel)
-
-    # Saiu do canal Cronômetro
-    if before_id == STOPWATCH_VOICE_ID and after_id != STOPWATCH_VOICE_ID:
-        if member.id in user_tasks and user_data.get(member.id, {}).get("mode") == "stopwatch":
-            await stop_session(member, reason="saiu do canal")
+    voice_events.inc()
+    log.debug("Voice state update - %s: %s -> %s", member.display_name, before_id, after_id)
+
+    # Agrupa os eventos do membro: só o canal final da rajada importa. Quem sai
+    # e volta (ou oscila entre canais) dentro da janela não perde a sessão.
+    now = scheduler.now()
+    pending = pending_voice.get(member.id)
+    if pending is None:
+        pending = pending_voice[member.id] = {"left_at": now}
+    pending["member"] = member
+    pending["channel"] = after.channel
+    pending["joined_at"] = now
+    deadline = min(now + VOICE_DEBOUNCE, pending["left_at"] + VOICE_DEBOUNCE_MAX)
+    scheduler.schedule(("voice", member.id), deadline, apply_voice_change)
+
+async def apply_voice_change(key, lateness: float):
+    """Aplica o canal final de uma rajada de eventos de voz de um membro"""
+    member_id = key[1]
+    pending = pending_voice.pop(member_id, None)
+    if pending is None:
+        return
+    member = pending["member"]
+    channel = pending["channel"]
+    channel_id = channel.id if channel else None
+    data = user_data.get(member_id)
+    if data is not None and data.voice_channel_id == channel_id:
+        return  # voltou ao mesmo canal: a sessão segue como estava
+
+    # Encerra a sessão anterior no instante em que saiu; o anúncio vai em segundo plano
+    if data is not None:
+        end_session(member_id, ended_at=pending["left_at"])
+    profile = routing.get(channel_id)
+    if profile is not None:
+        await start_session(member, channel, profile, started_at=pending["joined_at"])
+
+def reconcile_voice_channels(reason: str, guild: Optional[discord.Guild] = None):
+    """Acerta user_data com quem está de fato nos canais de voz configurados.
+
+    Quem já estava no canal quando o bot conectou não gera evento de voz: entra
+    em pending_voice como uma troca de canal, com o horário da reconciliação, e
+    o apply_voice_change inicia a sessão. Sessões de quem saiu sem o evento
+    chegar (ex.: durante a desconexão) são encerradas agora. Sem o intent de
+    membros o cache só tem quem está em voz: num servidor disponível, membro
+    fora do cache também saiu.
+
+    Com `guild`, só as sessões e os canais desse servidor (ex.: um servidor
+    que voltou: num novo IDENTIFY o evento chega uma vez por servidor).
+    """
+    now = scheduler.now()
+    if guild is None:
+        member_ids = list(user_data)
+        routes = routing.routes.items()
+    else:
+        member_ids = session_index.page(guild.id, 0, session_index.count(guild.id))
+        routes = [(c.id, routing.routes[c.id]) for c in guild.channels if c.id in routing.routes]
+    ended = 0
+    for member_id in member_ids:
+        data = user_data.get(member_id)
+        if data is None or member_id in pending_voice:
+            continue
+        session_guild = bot.get_guild(data.guild_id)
+        if session_guild is None:
+            continue  # servidor indisponível: reconcilia quando voltar (on_guild_available)
+        member = session_guild.get_member(member_id)
+        voice = member.voice if member else None
+        if voice is None or voice.channel is None or voice.channel.id != data.voice_channel_id:
+            end_session(member_id, ended_at=now)
+            ended += 1
+
+    # um horário livre por canal de anúncio; no modo painel não há mensagem inicial
+    next_slot = {}
+    started = 0
+    for voice_id, profile in routes:
+        channel = bot.get_channel(voice_id)
+        if channel is None:
+            continue  # canal de outro shard ou removido
+        for member in channel.members:
+            if member.bot or member.id in user_data or member.id in pending_voice:
+                continue
+            if DASHBOARD_MODE:
+                deadline = now
+            else:
+                deadline = next_slot.get(profile.announce_channel_id, now)
+                next_slot[profile.announce_channel_id] = deadline + RECONCILE_SPACING
+            pending_voice[member.id] = {"member": member, "channel": channel, "left_at": now, "joined_at": now}
+            scheduler.schedule(("voice", member.id), deadline, apply_voice_change)
+            started += 1
+
+    reconciled.inc("started", amount=started)
+    reconciled.inc("ended", amount=ended)
+    if started or ended:
+        log.info("Reconciliação (%s): %d sessão(ões) a iniciar, %d encerrada(s)", reason, started, ended)
+
+async def start_session(member: discord.Member, voice_channel, profile: ModeProfile, started_at: Optional[float] = None):
+    if profile.shared_room:
+        await join_room(member, voice_channel, profile, started_at)
+    elif profile.mode == "pomodoro":
+        await start_pomodoro(member, voice_channel, profile, started_at)
+    else:
+        await start_stopwatch(member, voice_channel, profile, started_at)
+
+async def routing_poll_tick(key, lateness: float):
+    if routing.changed_on_disk():
+        try:
+            reload_routing()
+        except (OSError, RoutingError) as e:
+            routing.mark_seen()
+            log.warning("Configuração de roteamento inválida, mantendo a anterior: %s", e)
+    scheduler.schedule_in(key, ROUTING_POLL_INTERVAL, routing_poll_tick)
+
+def reload_routing() -> RoutingTable:
+    """Troca a tabela de roteamento; sessões em andamento mantêm o perfil com que começaram"""
+    global routing
+    table = load_routing()
+    routing = table
+    log.info("Roteamento recarregado: %d canal(is) de voz, %d perfil(is)", len(table), len(table.profiles))
+    return table
+
+# ---------------- Agendamento ----------------
+# Todas as sessões compartilham um único agendador de deadlines (ver scheduler.py).
+# Os ticks são alinhados ao início da fase, então uma edição lenta não empurra
+# o fim da fase para frente.
+def next_tick_deadline(phase_start: float, interval: float, now: float, phase_end: Optional[float] = None) -> float:
+    steps = int((now - phase_start) // interval) + 1
+    deadline = phase_start + steps * interval
+    if phase_end is not None and deadline > phase_end:
+        deadline = phase_end
+    return deadline
+
+async def send_to_channel(channel: discord.abc.Messageable, **kwargs) -> discord.Message:
+    """Envia uma mensagem nova pelo dispatcher (respeita o orçamento do canal)"""
+    return await dispatcher.send(channel.id, lambda: channel.send(**kwargs))
+
+# ---------------- Renderização ----------------
+# Cada sessão guarda as partes fixas do seu embed (título, descrição, cor,
+# avatar) por "tela"; a cada tick só o rodapé é montado. Se o frame é igual ao
+# último enfileirado, a edição nem chega ao dispatcher.
+render_stats = {"sent": 0, "suppressed": 0}
+
+def render_progress(data: Session, member: Optional[discord.Member], screen, build_static,
+                    footer_text: str) -> Optional[dict]:
+    """Devolve o embed (como dict) do frame atual, ou None se nada visível mudou.
+
+    `screen` identifica as partes fixas; `build_static()` -> (title, description, color)
+    só é chamado quando a tela muda.
+    """
+    cache = data.render
+    static_key = (screen, member_name(data, member))
+    if cache is None or cache["static_key"] != static_key:
+        title, description, color = build_static()
+        static = make_embed(title=title, description=description, color=color, member=member).to_dict()
+        cache = data.render = {"static_key": static_key, "static": static, "last": None}
+
+    frame_key = (static_key, footer_text)
+    if cache["last"] == frame_key:
+        render_stats["suppressed"] += 1
+        return None
+    cache["last"] = frame_key
+    render_stats["sent"] += 1
+    frame = dict(cache["static"])
+    frame["footer"] = {"text": footer_text}
+    return frame
+
+def message_key(message_id: int) -> tuple:
+    """Chave da fila de edições: uma por mensagem, então progresso e frame final se substituem"""
+    return ("msg", message_id)
+
+def update_progress_message(member_id: int, data: Session, frame: dict):
+    """Enfileira o frame mais recente da mensagem de progresso da sessão"""
+    message_id = data.message_id
+    if message_id is None:
+        return
+
+    async def edit():
+        if user_data.get(member_id) is not data:
+            return  # sessão encerrada enquanto o frame estava na fila
+        if data.message_id != message_id:
+            # a mensagem foi reenviada: o frame vai para a fila da nova
+            update_progress_message(member_id, data, frame)
+            return
+        channel = bot.get_channel(data.announce_channel_id)
+        if channel is None:
+            return  # canal sumiu (ex.: recuperada sem canal de anúncio)
+        # o Embed e o PartialMessage só são montados para o frame que de fato sai
+        message = channel.get_partial_message(message_id)
+        await message.edit(content=data.mention, embed=discord.Embed.from_dict(frame))
+
+    async def on_error(exc: BaseException):
+        if not isinstance(exc, (discord.NotFound, discord.Forbidden)) or user_data.get(member_id) is not data:
+            return
+        channel = bot.get_channel(data.announce_channel_id)
+        if channel is None:
+            return
+        # Se a mensagem foi apagada ou não for possível editar, envia uma nova
+        msg = await send_to_channel(channel, content=data.mention, embed=discord.Embed.from_dict(frame))
+        if user_data.get(member_id) is data:
+            data.message_id = msg.id
+
+    dispatcher.submit_edit(data.announce_channel_id, message_key(message_id), edit, on_error=on_error)
+
+# ---------------- Persistência ----------------
+# Os horários das sessões vivem no relógio monotônico do loop; no banco ficam em
+# epoch para sobreviver a um reinício.
+def mono_to_epoch(t: float) -> float:
+    return time.time() + (t - scheduler.now())
+
+def epoch_to_mono(t: float) -> float:
+    return scheduler.now() + (t - time.time())
+
+def persist_session(member_id: int, data: Session):
+    """Coloca o estado atual da sessão no buffer do store (sem I/O aqui)"""
+    store.put({
+        "member_id": member_id,
+        "guild_id": data.guild_id,
+        "mode": data.mode,
+        "voice_channel_id": data.voice_channel_id,
+        "announce_channel_id": data.announce_channel_id,
+        "message_id": data.message_id,
+        "start_time": data.start_time,
+        "cycle_phase": data.cycle_phase,
+        "phase_start": mono_to_epoch(data.phase_start),
+        "phase_end": mono_to_epoch(data.phase_end) if data.phase_end is not None else None,
+        "focused_seconds": data.focused_seconds,
+        "updated_at": time.time(),
+        "room_origin": mono_to_epoch(data.room.origin) if data.room is not None else None,
+    })
+
+def record_finished_session(data: Session, ended_at: float, focused_seconds: int):
+    """Manda a sessão encerrada para o histórico/agregados (gravados no próximo flush)"""
+    store.record_session(
+        guild_id=data.guild_id,
+        member_id=data.member_id,
+        mode=data.mode,
+        started_at=data.start_time,
+        ended_at=mono_to_epoch(ended_at),
+        focused_seconds=focused_seconds,
+    )
+
+async def store_flush_tick(key, lateness: float):
+    store.set_session_counts(session_index.mode_counts())  # lidas pelo !status dos outros processos
+    try:
+        await store.flush()
+    except Exception:
+        log.exception("Falha ao gravar sessões")
+    scheduler.schedule_in(key, STORE_FLUSH_INTERVAL, store_flush_tick)
+
+def owned_shards():
+    """(shard_count, shard_ids) deste processo; shard_ids None = todos"""
+    shard_count = bot.shard_count or 1
+    shard_ids = getattr(bot, "shard_ids", None)
+    return shard_count, (list(shard_ids) if shard_ids is not None and shard_count > 1 else None)
+
+async def recover_sessions():
+    """Adota as sessões gravadas dos servidores dos nossos shards e reaproveita as mensagens.
+
+    Vale tanto para o reinício do mesmo processo quanto para um rebalanceamento:
+    o tempo acumulado vem do registro, e quem saiu do canal nesse meio tempo é
+    encerrado no último batimento do dono anterior. Sem o intent de membros, o
+    cache só tem quem está em voz: num servidor disponível, membro fora do
+    cache também saiu. As salas compartilhadas são remontadas com a origem
+    gravada, então o ciclo continua de onde estava.
+    """
+    shard_count, shard_ids = owned_shards()
+    store.set_shards(shard_count, shard_ids)
+    rows = await asyncio.to_thread(store.adopt_sessions, shard_count, shard_ids)
+    fallback_heartbeat = await asyncio.to_thread(store.heartbeat) or time.time()
+    # quem saiu durante a queda só é encerrado no fim: uma sala só fecha depois
+    # de todos os seus membros terem sido lidos
+    departed = []
+    for row in rows:
+        heartbeat = row["owner_heartbeat"] or fallback_heartbeat
+        member_id = row["member_id"]
+        if member_id in user_data:
+            continue  # já voltou por um evento de voz: a sessão viva regrava a linha
+        guild = bot.get_guild(row["guild_id"])
+        if guild is None and shard_ids is not None and shard_of(row["guild_id"], shard_count) not in shard_ids:
+            store.delete(member_id)  # servidor de outro processo
+            continue
+        # servidor nosso mas indisponível: a sessão segue e o on_guild_available reconcilia
+        member = guild.get_member(member_id) if guild else None
+
+        # o perfil atual do canal; se o canal saiu da configuração, o padrão do modo
+        profile = routing.get(row["voice_channel_id"]) or DEFAULT_PROFILES[row["mode"]]
+        announce = bot.get_channel(row["announce_channel_id"])
+        if announce is None and guild is not None:
+            announce = get_announcement_channel(guild, profile.announce_channel_id)
+        announce_channel_id = announce.id if announce else row["announce_channel_id"]
+        room = None
+        if row["room_origin"] is not None:
+            room = rooms.get(row["voice_channel_id"])
+            if room is None:
+                room = rooms[row["voice_channel_id"]] = Room(
+                    row["voice_channel_id"], row["guild_id"], profile, announce_channel_id,
+                    origin=epoch_to_mono(row["room_origin"]))
+                room.message_id = row["message_id"]
+            profile = room.profile
+        data = Session(
+            member_id=member_id,
+            guild_id=row["guild_id"],
+            mode=row["mode"],
+            profile=profile,
+            voice_channel_id=row["voice_channel_id"],
+            announce_channel_id=announce_channel_id,
+            start_time=row["start_time"],
+            phase_start=epoch_to_mono(row["phase_start"]),
+        )
+        if room is not None:
+            data.room = room
+            room.members[member_id] = data
+        elif row["mode"] == "pomodoro":
+            data.focused_seconds = row["focused_seconds"]
+            data.cycle_phase = row["cycle_phase"]
+            data.phase_end = epoch_to_mono(row["phase_end"])
+        data.message_id = row["message_id"]
+        track_session(data)
+
+        voice = member.voice if member else None
+        if guild is not None and (voice is None or voice.channel is None
+                                  or voice.channel.id != row["voice_channel_id"]):
+            # saiu enquanto o bot estava fora: credita até o último batimento gravado
+            log.info("Sessão de %s encerrada durante a queda", member_name(data, member))
+            departed.append((member_id, epoch_to_mono(heartbeat)))
+            continue
+
+        log.info("Sessão de %s recuperada (%s)", member_name(data, member), row["mode"])
+        if room is not None:
+            # o deadline e a mensagem são da sala (abaixo)
+            if DASHBOARD_MODE and announce is not None:
+                await dashboard_join(member_id, announce)
+            persist_session(member_id, data)
+            continue
+        if data.mode == "pomodoro":
+            catch_up_pomodoro(data, scheduler.now())
+        if DASHBOARD_MODE:
+            if announce is not None:
+                await dashboard_join(member_id, announce)
+            if data.mode == "pomodoro":
+                scheduler.schedule(member_id, data.phase_end, pomodoro_tick)
+        else:
+            if data.message_id is None and announce is not None:
+                msg = await send_to_channel(announce, content=data.mention, embed=make_embed(
+                    title="📚 Sessão Retomada", description=f"Sessão de {member_name(data, member)} retomada.",
+                    color=0x0055AA, member=member))
+                data.message_id = msg.id
+            tick = pomodoro_tick if data.mode == "pomodoro" else stopwatch_tick
+            scheduler.schedule(member_id, scheduler.now(), tick)
+        persist_session(member_id, data)
+
+    for member_id, ended_at in departed:
+        end_session(member_id, ended_at=ended_at)
+    for vid, room in list(rooms.items()):
+        if ("room", vid) in scheduler:
+            continue
+        room.advance(scheduler.now())  # fases vencidas durante a queda passam em silêncio
+        channel = bot.get_channel(room.announce_channel_id)
+        if not DASHBOARD_MODE and room.message_id is None and channel is not None:
+            try:
+                await send_room_message(room, channel)
+            except discord.HTTPException as e:
+                log.warning("Falha ao reenviar a mensagem da sala %s: %r", vid, e)
+        if rooms.get(vid) is room:
+            scheduler.schedule(("room", vid), scheduler.now(), room_tick)
+
+# ---------------- Painel (dashboard) ----------------
+# No modo painel cada canal de anúncio tem uma única mensagem fixada com todas as
+# sessões ativas, editada uma vez por intervalo — o custo de API não cresce com o
+# número de membros.
+DASHBOARD_TITLE = "📋 Painel de Sessões"
+EMBED_TOTAL_LIMIT = 6000     # limite de caracteres somando todos os embeds da mensagem
+EMBED_FIELD_VALUE_LIMIT = 1024
+EMBED_FIELDS_LIMIT = 25
+EMBEDS_PER_MESSAGE = 10
+CONTENT_LIMIT = 2000         # caracteres do conteúdo (as menções dos anúncios agrupados)
+
+dashboards = {}  # announce_channel.id -> {"channel", "message", "members"}
+
+def dashboard_line(data: Session, now: float) -> str:
+    name = discord.utils.escape_markdown(member_name(data, session_member(data)))
+    if data.mode == "pomodoro":
+        cycle = data.room if data.room is not None else data  # na sala, a fase é a do canal
+        remaining = max(0, int(cycle.phase_end - now))
+        if cycle.cycle_phase == "focus":
+            return f"🍅 **{name}** — foco · restam {fmt_hms(remaining)}"
+        return f"⏸️ **{name}** — pausa · volta em {fmt_hms(remaining)}"
+    return f"⏱️ **{name}** — {fmt_hms(int(now - data.phase_start))}"
+
+def render_dashboard(member_ids, now: float):
+    """Monta os embeds do painel respeitando os limites de campos/caracteres do Discord"""
+    sessions = [user_data[mid] for mid in member_ids if mid in user_data]
+    header = make_embed(
+        title=DASHBOARD_TITLE,
+        description=f"{len(sessions)} sessão(ões) ativa(s)" if sessions else "Nenhuma sessão ativa no momento.",
+        color=0x0055AA,
+    )
+    embeds = [header]
+    used = len(header.title) + len(header.description) + 64  # folga para o rodapé
+    lines = []
+    shown = 0
+
+    def add_field() -> bool:
+        nonlocal used
+        name = "Sessões" if not embeds[-1].fields and len(embeds) == 1 else "\u200b"
+        if len(embeds[-1].fields) >= EMBED_FIELDS_LIMIT:
+            if len(embeds) >= EMBEDS_PER_MESSAGE:
+                return False
+            embeds.append(discord.Embed(color=0x0055AA))
+        value = "\n".join(lines)
+        embeds[-1].add_field(name=name, value=value, inline=False)
+        used += len(name) + len(value)
+        lines.clear()
+        return True
+
+    pending = 0  # caracteres já reservados em `lines`
+    for data in sessions:
+        line = dashboard_line(data, now)
+        if pending + len(line) + 1 > EMBED_FIELD_VALUE_LIMIT:
+            if not add_field():
+                break
+            pending = 0
+        if used + pending + len(line) + 1 > EMBED_TOTAL_LIMIT:
+            break
+        lines.append(line)
+        pending += len(line) + 1
+        shown += 1
+    if lines and not add_field():
+        shown -= len(lines)
+
+    hidden = len(sessions) - shown
+    if hidden > 0:
+        embeds[-1].set_footer(text=f"... e mais {hidden} sessão(ões)")
+    return embeds
+
+async def find_dashboard_message(channel: discord.TextChannel) -> Optional[discord.Message]:
+    """Reaproveita um painel já fixado pelo bot (ex.: depois de reiniciar)"""
+    try:
+        pins = await channel.pins()
+    except discord.HTTPException:
+        return None
+    for msg in pins:
+        if msg.author == bot.user and msg.embeds and (msg.embeds[0].title or "").endswith(DASHBOARD_TITLE):
+            return msg
+    return None
+
+async def dashboard_join(member_id: int, channel: discord.TextChannel):
+    board = dashboards.get(channel.id)
+    if board is None:
+        board = dashboards[channel.id] = {"channel": channel, "message": None, "members": {}, "lock": asyncio.Lock()}
+    board["members"][member_id] = None
+    # várias entradas ao mesmo tempo não podem criar dois painéis
+    async with board["lock"]:
+        if board["message"] is None and channel.id in stored_dashboards:
+            board["message"] = channel.get_partial_message(stored_dashboards[channel.id])
+        if board["message"] is None:
+            board["message"] = await find_dashboard_message(channel)
+        if board["message"] is None:
+            msg = await send_to_channel(channel, embeds=render_dashboard(board["members"], scheduler.now()))
+            board["message"] = msg
+            try:
+                await msg.pin()
+            except discord.HTTPException:
+                pass
+        if stored_dashboards.get(channel.id) != board["message"].id:
+            stored_dashboards[channel.id] = board["message"].id
+            store.put_dashboard(channel.id, board["message"].id)
+    if ("dashboard", channel.id) not in scheduler:
+        scheduler.schedule(("dashboard", channel.id), scheduler.now(), dashboard_tick)
+
+def dashboard_leave(member_id: int, channel_id: int):
+    board = dashboards.get(channel_id)
+    if board is not None:
+        board["members"].pop(member_id, None)
+        # atualiza já para o membro sair do painel sem esperar o próximo tick
+        scheduler.schedule(("dashboard", channel_id), scheduler.now(), dashboard_tick)
+
+async def dashboard_tick(key, lateness: float):
+    channel_id = key[1]
+    board = dashboards.get(channel_id)
+    if board is None or board["message"] is None:
+        return
+    embeds = render_dashboard(board["members"], scheduler.now())
+    payload = [e.to_dict() for e in embeds]
+    if payload == board.get("last"):
+        render_stats["suppressed"] += 1
+        if board["members"]:
+            scheduler.schedule(key, next_tick_deadline(0.0, DASHBOARD_UPDATE_INTERVAL, scheduler.now()), dashboard_tick)
+        return
+    board["last"] = payload
+    render_stats["sent"] += 1
+
+    async def edit():
+        await board["message"].edit(content=None, embeds=embeds)
+
+    async def on_error(exc: BaseException):
+        if isinstance(exc, (discord.NotFound, discord.Forbidden)):
+            # painel apagado: recria e fixa de novo
+            msg = await send_to_channel(board["channel"], embeds=embeds)
+            board["message"] = msg
+            stored_dashboards[channel_id] = msg.id
+            store.put_dashboard(channel_id, msg.id)
+            try:
+                await msg.pin()
+            except discord.HTTPException:
+                pass
+
+    dispatcher.submit_edit(channel_id, ("dashboard", channel_id), edit, on_error=on_error)
+    if board["members"]:
+        scheduler.schedule(key, next_tick_deadline(0.0, DASHBOARD_UPDATE_INTERVAL, scheduler.now()), dashboard_tick)
 
 # ---------------- Pomodoro ----------------
-async def start_pomodoro(member: discord.Member, voice_channel):
-    announce = get_announcement_channel(member.guild, POMODORO_ANNOUNCE_CHANNEL_ID)
-    print(f"DEBUG: Pomodoro announcement channel: {announce}")
+async def start_pomodoro(member: discord.Member, voice_channel, profile: ModeProfile, started_at: Optional[float] = None):
+    announce = get_announcement_channel(member.guild, profile.announce_channel_id)
     if announce is None:
-        print(f"DEBUG: Could not find text channel with ID {POMODORO_ANNOUNCE_CHANNEL_ID}")
-        # Try to find any text channel in the guild
-        for channel in member.guild.text_channels:
-            if channel.permissions_for(member.guild.me).send_messages:
-                announce = channel
-                print(f"DEBUG: Using fallback text channel: {announce.name} ({announce.id})")
-                break
-        if announce is None:
-            print("DEBUG: No text channels found where bot can send messages")
-            return
+        log.warning("No text channel for Pomodoro announcements in %s", member.guild.name)
+        return
 
-    start_time = datetime.datetime.utcnow()
-    user_data[member.id] = {
-        "start_time": start_time,
-        "focused_seconds": 0,
-        "mode": "pomodoro",
-        "voice_channel": voice_channel.id,
-        "cycle_phase": "focus"  # "focus" ou "break"
-    }
+    # started_at: quando entrou no canal (relógio do loop), antes da janela de agrupamento
+    now = scheduler.now() if started_at is None else started_at
+    data = Session(
+        member_id=member.id,
+        guild_id=member.guild.id,
+        profile=profile,
+        voice_channel_id=voice_channel.id,
+        announce_channel_id=announce.id,
+        start_time=mono_to_epoch(now),
+        phase_start=now,         # relógio monotônico do loop
+    )
+    data.cycle_phase = "focus"  # "focus" ou "break"
+    data.phase_end = now + profile.focus_seconds
+    track_session(data)
+
+    if DASHBOARD_MODE:
+        await dashboard_join(member.id, announce)
+        if user_data.get(member.id) is data:
+            persist_session(member.id, data)
+            scheduler.schedule(member.id, data.phase_end, pomodoro_tick)
+        return
 
     # Envia a mensagem de progresso inicial
     embed = make_embed(
         title="📚 Sessão de Foco Iniciada",
-        description=f"Continue firme, {member.display_name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!",
+        description=f"Continue firme, {member.display_name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!"
+                    + (f"\n\n{timestamp_lines(data)}" if profile.relative_timestamps else ""),
         color=0x0055AA,  # azul enquanto foca
         member=member,
         footer_text="Pomodoro em andamento"
     )
     try:
-        msg = await announce.send(content=f"{member.mention}", embed=embed)
+        msg = await send_to_channel(announce, content=f"{member.mention}", embed=embed)
     except discord.Forbidden:
+        if user_data.get(member.id) is data:
+            untrack_session(member.id)
         return
+    if user_data.get(member.id) is not data:
+        return  # sessão encerrada enquanto enviávamos
 
-    user_data[member.id]["message"] = msg
-    task = asyncio.create_task(pomodoro_loop(member, announce))
-    user_tasks[member.id] = task
+    data.message_id = msg.id
+    persist_session(member.id, data)
+    # com relative_timestamps a mensagem inicial já conta sozinha até o fim da fase
+    first_tick = data.phase_end if profile.relative_timestamps else scheduler.now()
+    scheduler.schedule(member.id, first_tick, pomodoro_tick)
 
-async def pomodoro_loop(member: discord.Member, announce_channel: discord.TextChannel):
-    member_id = member.id
-    focused = 0
-    try:
-        while True:
-            # ===== FASE DE FOCO =====
-            user_data[member_id]["cycle_phase"] = "focus"
-            focus_start = datetime.datetime.utcnow()
-            phase_end = focus_start + datetime.timedelta(seconds=POMODORO_FOCUS)
-            msg = user_data[member_id].get("message")
-
-            while True:
-                now = datetime.datetime.utcnow()
-                if now >= phase_end:
-                    # ciclo completo
-                    focused += POMODORO_FOCUS
-                    user_data[member_id]["focused_seconds"] = focused
-                    break
-
-                remaining = int((phase_end - now).total_seconds())
-                elapsed_focus_partial = int((now - focus_start).total_seconds())
-
-                # Atualiza embed de progresso
-                embed = make_embed(
-                    title="📚 Foco em Andamento",
-                    description=f"Continue firme, {member.display_name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!",
-                    color=0x0055AA,
-                    member=member,
-                    footer_text=f"Tempo de foco: {fmt_hms(elapsed_focus_partial)} · Restam: {fmt_hms(remaining)}"
-                )
-                try:
-                    await msg.edit(content=f"{member.mention}", embed=embed)
-                except (discord.NotFound, discord.Forbidden):
-                    # Se a mensagem foi apagada ou não for possível editar, envia uma nova
-                    msg = await announce_channel.send(content=f"{member.mention}", embed=embed)
-                    user_data[member_id]["message"] = msg
-
-                # espera UPDATE_INTERVAL ou até cancelamento
-                try:
-                    await asyncio.sleep(POMODORO_UPDATE_INTERVAL)
-                except asyncio.CancelledError:
-                    # saiu durante foco -> contabiliza parcial
-                    now2 = datetime.datetime.utcnow()
-                    elapsed_partial = int((now2 - focus_start).total_seconds())
-                    focused += elapsed_partial
-                    user_data[member_id]["focused_seconds"] = focused
-                    raise
-
-            # Ao completar foco -> notifica pausa
-            user_data[member_id]["focused_seconds"] = focused
-            try:
-                embed = make_embed(
-                    title="✅ Ciclo de Foco Concluído",
-                    description=f"Hora de pausar por {POMODORO_BREAK//60} minutos, {member.display_name}!",
-                    color=0x888888,
-                    member=member,
-                    footer_text="Pausa iniciada"
-                )
-                await announce_channel.send(content=f"{member.mention}", embed=embed)
-            except discord.Forbidden:
-                pass
+async def pomodoro_tick(member_id: int, lateness: float):
+    data = user_data.get(member_id)
+    if data is None or data.mode != "pomodoro":
+        return
 
-            # ===== FASE DE PAUSA =====
-            pause_start = datetime.datetime.utcnow()
-            pause_end = pause_start + datetime.timedelta(seconds=POMODORO_BREAK)
-            user_data[member_id]["cycle_phase"] = "break"
-
-            while True:
-                now = datetime.datetime.utcnow()
-                if now >= pause_end:
-                    break
-                remaining_pause = int((pause_end - now).total_seconds())
-                elapsed_pause = int((now - pause_start).total_seconds())
-
-                embed = make_embed(
-                    title="⏸️ Pausa em Andamento",
-                    description=f"Descanse um pouco, {member.display_name}! Volta em {fmt_hms(remaining_pause)}",
-                    color=0x888888,  # cinza para pausa
-                    member=member,
-                    footer_text=f"Tempo de pausa: {fmt_hms(elapsed_pause)} · Restam: {fmt_hms(remaining_pause)}"
-                )
-                msg = user_data[member_id].get("message")
-                try:
-                    await msg.edit(content=f"{member.mention}", embed=embed)
-                except (discord.NotFound, discord.Forbidden):
-                    msg = await announce_channel.send(content=f"{member.mention}", embed=embed)
-                    user_data[member_id]["message"] = msg
-
-                try:
-                    await asyncio.sleep(POMODORO_UPDATE_INTERVAL)
-                except asyncio.CancelledError:
-                    # cancelado durante pausa: não contabiliza pausa
-                    raise
-
-            # pausa finalizada -> notifica retorno ao foco
-            try:
-                embed = make_embed(
-                    title="⏰ Pausa Finalizada",
-                    description=f"Hora de voltar ao foco, {member.display_name}!",
-                    color=0x0055AA,
-                    member=member,
-                    footer_text="Novo ciclo de foco iniciado"
-                )
-                await announce_channel.send(content=f"{member.mention}", embed=embed)
-            except discord.Forbidden:
-                pass
+    now = scheduler.now()
+    if now >= data.phase_end:
+        advance_pomodoro_phase(member_id, data)
+        if user_data.get(member_id) is not data:
+            return
+        now = scheduler.now()
 
-            # loop continua para próximo ciclo automático
+    phase_start = data.phase_start
+    phase_end = data.phase_end
+    if DASHBOARD_MODE:
+        # o painel do canal mostra o progresso; aqui só interessam as trocas de fase
+        scheduler.schedule(member_id, phase_end, pomodoro_tick)
+        return
 
-    except asyncio.CancelledError:
-        # Sessão interrompida (usuário saiu do canal ou mudou)
-        end_time = datetime.datetime.utcnow()
-        total_focused = user_data.get(member_id, {}).get("focused_seconds", focused)
+    member = session_member(data)
+    name = member_name(data, member)
+    if data.profile.relative_timestamps:
+        # o cliente do Discord faz a contagem: uma edição por fase, na troca
+        focus = data.cycle_phase == "focus"
+        frame = render_progress(data, member, (data.cycle_phase, phase_start), lambda: (
+            "📚 Foco em Andamento" if focus else "⏸️ Pausa em Andamento",
+            (f"Continue firme, {name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!"
+             if focus else f"Descanse um pouco, {name}!") + "\n\n" + timestamp_lines(data),
+            0x0055AA if focus else 0x888888,
+        ), footer_text="Pomodoro em andamento")
+        if frame is not None:
+            update_progress_message(member_id, data, frame)
+        scheduler.schedule(member_id, phase_end, pomodoro_tick)
+        return
 
-        # Envia mensagem de conclusão personalizada
-        embed = make_embed(
-            title="🎉 Sessão Finalizada",
-            description=f"Parabéns, {member.display_name}! Você manteve o foco por {fmt_hms(total_focused)} — ótimo trabalho investindo em você mesmo(a)!",
-            color=0x22AA55,  # verde final
-            member=member,
-            footer_text="Sessão de Pomodoro finalizada"
-        )
+    remaining = max(0, int(phase_end - now))
+    elapsed = int(now - phase_start)
+    if data.cycle_phase == "focus":
+        # Atualiza embed de progresso
+        frame = render_progress(data, member, "focus", lambda: (
+            "📚 Foco em Andamento",
+            f"Continue firme, {name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!",
+            0x0055AA,
+        ), footer_text=f"Tempo de foco: {fmt_hms(elapsed)} · Restam: {fmt_hms(remaining)}")
+    else:
+        remaining_text = fmt_hms(remaining)
+        frame = render_progress(data, member, ("break", remaining_text), lambda: (
+            "⏸️ Pausa em Andamento",
+            f"Descanse um pouco, {name}! Volta em {remaining_text}",
+            0x888888,  # cinza para pausa
+        ), footer_text=f"Tempo de pausa: {fmt_hms(elapsed)} · Restam: {remaining_text}")
+    if frame is not None:
+        update_progress_message(member_id, data, frame)
+
+    if user_data.get(member_id) is data:
+        next_deadline = next_tick_deadline(phase_start, data.profile.update_interval, scheduler.now(), phase_end)
+        scheduler.schedule(member_id, next_deadline, pomodoro_tick)
+
+def next_pomodoro_phase(data: Session) -> str:
+    """Fecha a fase atual e abre a próxima, ancorada no fim exato da anterior"""
+    profile = data.profile
+    new_start = data.phase_end
+    data.phase_start = new_start
+    if data.cycle_phase == "focus":
+        # ciclo completo
+        data.focused_seconds += profile.focus_seconds
+        data.cycle_phase = "break"
+        data.phase_end = new_start + profile.break_seconds
+    else:
+        data.cycle_phase = "focus"
+        data.phase_end = new_start + profile.focus_seconds
+    return data.cycle_phase
+
+def catch_up_pomodoro(data: Session, until: float):
+    """Avança em silêncio todas as fases que terminaram até `until`"""
+    while until >= data.phase_end:
+        next_pomodoro_phase(data)
+
+def advance_pomodoro_phase(member_id: int, data: Session):
+    member = session_member(data)
+    name = member_name(data, member)
+    # Se o loop atrasou mais de uma fase, avança todas sem perder tempo
+    while scheduler.now() >= data.phase_end:
+        if next_pomodoro_phase(data) == "break":
+            embed = make_embed(
+                title="✅ Ciclo de Foco Concluído",
+                description=f"Hora de pausar por {data.profile.break_seconds//60} minutos, {name}!",
+                color=0x888888,
+                member=member,
+                footer_text="Pausa iniciada"
+            )
+        else:
+            embed = make_embed(
+                title="⏰ Pausa Finalizada",
+                description=f"Hora de voltar ao foco, {name}!",
+                color=0x0055AA,
+                member=member,
+                footer_text="Novo ciclo de foco iniciado"
+            )
+        persist_session(member_id, data)
+        announce(data, embed)
+
+def finish_pomodoro(member_id: int, data: Session, ended_at: float):
+    # Sessão interrompida (usuário saiu do canal ou mudou)
+    catch_up_pomodoro(data, ended_at)
+    if data.cycle_phase == "focus":
+        # saiu durante foco -> contabiliza parcial
+        partial = ended_at - data.phase_start
+        data.focused_seconds += max(0, int(partial))
+    # cancelado durante pausa: não contabiliza pausa
+    total_focused = data.focused_seconds
+    record_finished_session(data, ended_at, total_focused)
+
+    # Envia mensagem de conclusão personalizada
+    member = session_member(data)
+    embed = make_embed(
+        title="🎉 Sessão Finalizada",
+        description=f"Parabéns, {member_name(data, member)}! Você manteve o foco por {fmt_hms(total_focused)} — ótimo trabalho investindo em você mesmo(a)!",
+        color=0x22AA55,  # verde final
+        member=member,
+        footer_text="Sessão de Pomodoro finalizada"
+    )
+    announce(data, embed)
+
+# ---------------- Sala compartilhada ----------------
+# Com "shared_room" no perfil, o canal de voz roda um único ciclo (Room): um
+# deadline no agendador, uma mensagem de progresso e um anúncio por troca de
+# fase, não importa quantos membros estejam nele. Quem entra no meio pega a
+# fase em andamento; o foco de cada um sai da linha do tempo da sala quando
+# ele vai embora.
+ROOM_NAMES_SHOWN = 20  # membros listados na mensagem da sala
+
+async def join_room(member: discord.Member, voice_channel, profile: ModeProfile, started_at: Optional[float] = None):
+    announce = get_announcement_channel(member.guild, profile.announce_channel_id)
+    if announce is None:
+        log.warning("No text channel for Pomodoro announcements in %s", member.guild.name)
+        return
+
+    now = scheduler.now() if started_at is None else started_at
+    room = rooms.get(voice_channel.id)
+    opened = room is None
+    if opened:
+        room = rooms[voice_channel.id] = Room(voice_channel.id, member.guild.id, profile, announce.id, origin=now)
+        log.info("Sala aberta em %s", voice_channel.name)
+    data = Session(
+        member_id=member.id,
+        guild_id=member.guild.id,
+        profile=room.profile,
+        voice_channel_id=voice_channel.id,
+        announce_channel_id=room.announce_channel_id,
+        start_time=mono_to_epoch(now),
+        phase_start=now,         # entrada do membro; as fases são as da sala
+    )
+    data.room = room
+    data.message_id = room.message_id
+    room.members[member.id] = data
+    track_session(data)
+    persist_session(member.id, data)
+
+    if DASHBOARD_MODE:
+        await dashboard_join(member.id, announce)
+    elif not opened:
+        refresh_room(room)
+    else:
         try:
-            await announce_channel.send(content=f"{member.mention}", embed=embed)
+            await send_room_message(room, announce)
         except discord.Forbidden:
-            pass
+            if rooms.get(voice_channel.id) is room:
+                del rooms[voice_channel.id]
+                for member_id in list(room.members):
+                    untrack_session(member_id)
+                    store.delete(member_id)
+            return
+    if opened and rooms.get(voice_channel.id) is room:
+        scheduler.schedule(("room", voice_channel.id), scheduler.now(), room_tick)
+
+async def room_tick(key, lateness: float):
+    room = rooms.get(key[1])
+    if room is None:
+        return
 
-        # limpeza
-        user_tasks.pop(member_id, None)
-        user_data.pop(member_id, None)
+    now = scheduler.now()
+    if room.advance(now):
+        announce_room_phase(room)
+    if DASHBOARD_MODE:
+        # o painel mostra o progresso de cada membro; aqui só interessam as trocas de fase
+        scheduler.schedule(key, room.phase_end, room_tick)
         return
 
+    if room.message_id is not None:
+        frame = render_room(room, now)
+        if frame is not None:
+            update_room_message(room, frame)
+    if room.profile.relative_timestamps:
+        # o cliente conta sozinho; entradas e saídas antecipam o tick (refresh_room)
+        scheduler.schedule(key, room.phase_end, room_tick)
+        return
+    scheduler.schedule(key, next_tick_deadline(room.phase_start, room.profile.update_interval, now, room.phase_end),
+                       room_tick)
+
+def refresh_room(room: Room):
+    """Com relative_timestamps não há ticks entre as fases: atualiza a lista de membros em breve"""
+    if DASHBOARD_MODE or not room.profile.relative_timestamps:
+        return
+    key = ("room", room.voice_channel_id)
+    deadline = min(scheduler.deadline_of(key) or room.phase_end, scheduler.now() + room.profile.update_interval)
+    scheduler.schedule(key, deadline, room_tick)
+
+def announce_room_phase(room: Room):
+    if room.cycle_phase == "break":
+        embed = make_embed(
+            title="✅ Ciclo de Foco Concluído",
+            description=f"Hora de pausar por {room.profile.break_seconds//60} minutos, pessoal!",
+            color=0x888888,
+            footer_text="Pausa iniciada"
+        )
+    else:
+        embed = make_embed(
+            title="⏰ Pausa Finalizada",
+            description="Hora de voltar ao foco, pessoal!",
+            color=0x0055AA,
+            footer_text="Novo ciclo de foco iniciado"
+        )
+    announce(room, embed)
+
+def render_room(room: Room, now: float) -> Optional[dict]:
+    """Embed (como dict) da mensagem da sala, ou None se nada visível mudou"""
+    shown = [data for _, data in zip(range(ROOM_NAMES_SHOWN), room.members.values())]
+    static_key = (room.cycle_phase, room.phase_start, tuple(data.member_id for data in shown), len(room.members))
+    cache = room.render
+    if cache is None or cache["static_key"] != static_key:
+        lines = [f"• {discord.utils.escape_markdown(member_name(data, session_member(data)))}" for data in shown]
+        if len(room.members) > len(shown):
+            lines.append(f"… e mais {len(room.members) - len(shown)}")
+        people = f"{len(room.members)} pessoa(s) na sala:\n" + "\n".join(lines)
+        if room.profile.relative_timestamps:
+            end = mono_to_epoch(room.phase_end)
+            people = (f"⏳ {'Foco' if room.cycle_phase == 'focus' else 'Pausa'} termina "
+                      f"{discord_timestamp(end, 'R')} (às {discord_timestamp(end, 'T')})\n\n{people}")
+        if room.cycle_phase == "focus":
+            title, description, color = "📚 Sala de Foco — Foco em Andamento", f"Foco juntos! {people}", 0x0055AA
+        else:
+            title, description, color = "⏸️ Sala de Foco — Pausa", f"Descansem um pouco! {people}", 0x888888
+        static = make_embed(title=title, description=description, color=color).to_dict()
+        cache = room.render = {"static_key": static_key, "static": static, "last": None}
+
+    label = "foco" if room.cycle_phase == "focus" else "pausa"
+    if room.profile.relative_timestamps:
+        footer_text = "Sala de foco em andamento"  # a contagem está na descrição
+    else:
+        footer_text = (f"Tempo de {label}: {fmt_hms(int(now - room.phase_start))} · "
+                       f"Restam: {fmt_hms(max(0, int(room.phase_end - now)))}")
+    frame_key = (static_key, footer_text)
+    if cache["last"] == frame_key:
+        render_stats["suppressed"] += 1
+        return None
+    cache["last"] = frame_key
+    render_stats["sent"] += 1
+    frame = dict(cache["static"])
+    frame["footer"] = {"text": footer_text}
+    return frame
+
+async def send_room_message(room: Room, channel: discord.TextChannel):
+    """Envia uma mensagem de progresso nova para a sala e a registra nas sessões dela"""
+    room.render = None
+    frame = render_room(room, scheduler.now())
+    msg = await send_to_channel(channel, content=f"<#{room.voice_channel_id}>", embed=discord.Embed.from_dict(frame))
+    if rooms.get(room.voice_channel_id) is not room:
+        return
+    room.message_id = msg.id
+    for member_id, data in room.members.items():
+        data.message_id = msg.id
+        persist_session(member_id, data)
+
+def update_room_message(room: Room, frame: dict):
+    """Enfileira o frame mais recente da mensagem da sala"""
+    vid = room.voice_channel_id
+    message_id = room.message_id
+
+    async def edit():
+        if rooms.get(vid) is not room:
+            return  # sala fechada enquanto o frame estava na fila
+        if room.message_id != message_id:
+            update_room_message(room, frame)  # mensagem reenviada: vai para a fila da nova
+            return
+        channel = bot.get_channel(room.announce_channel_id)
+        if channel is None:
+            return
+        message = channel.get_partial_message(message_id)
+        await message.edit(content=f"<#{vid}>", embed=discord.Embed.from_dict(frame))
+
+    async def on_error(exc: BaseException):
+        if not isinstance(exc, (discord.NotFound, discord.Forbidden)) or rooms.get(vid) is not room:
+            return
+        channel = bot.get_channel(room.announce_channel_id)
+        if channel is not None:
+            await send_room_message(room, channel)
+
+    dispatcher.submit_edit(room.announce_channel_id, message_key(message_id), edit, on_error=on_error)
+
+def leave_room(member_id: int, data: Session, ended_at: float):
+    """Credita o foco da sala no período em que o membro esteve nela; fecha a sala vazia"""
+    room = data.room
+    data.focused_seconds = room.focused_between(data.phase_start, ended_at)
+    record_finished_session(data, ended_at, data.focused_seconds)
+
+    member = session_member(data)
+    embed = make_embed(
+        title="🎉 Sessão Finalizada",
+        description=f"Parabéns, {member_name(data, member)}! Você manteve o foco por {fmt_hms(data.focused_seconds)} — ótimo trabalho investindo em você mesmo(a)!",
+        color=0x22AA55,
+        member=member,
+        footer_text="Sessão na sala de foco finalizada"
+    )
+    announce(data, embed)
+
+    if room.members.get(member_id) is data:
+        del room.members[member_id]
+    if room.members:
+        refresh_room(room)
+    elif rooms.get(room.voice_channel_id) is room:
+        del rooms[room.voice_channel_id]
+        scheduler.cancel(("room", room.voice_channel_id))
+        if room.message_id is not None:
+            dispatcher.discard(room.announce_channel_id, message_key(room.message_id))
+        if room.profile.relative_timestamps and room.message_id is not None and not DASHBOARD_MODE:
+            end = mono_to_epoch(ended_at)
+            submit_final_edit(room.announce_channel_id, room.message_id, f"<#{room.voice_channel_id}>", make_embed(
+                title="✅ Sala de Foco Encerrada",
+                description=f"Todos saíram da sala {discord_timestamp(end, 'R')}.\n"
+                            f"🕒 Das {discord_timestamp(mono_to_epoch(room.origin), 'T')} às {discord_timestamp(end, 'T')}",
+                color=0x22AA55,
+            ))
+        log.info("Sala fechada (%s)", room.voice_channel_id)
+
 # ---------------- Cronômetro (stopwatch) ----------------
-async def start_stopwatch(member: discord.Member, voice_channel):
-    announce = get_announcement_channel(member.guild, STOPWATCH_ANNOUNCE_CHANNEL_ID)
-    print(f"DEBUG: Stopwatch announcement channel: {announce}")
+async def start_stopwatch(member: discord.Member, voice_channel, profile: ModeProfile, started_at: Optional[float] = None):
+    announce = get_announcement_channel(member.guild, profile.announce_channel_id)
     if announce is None:
-        print(f"DEBUG: Could not find text channel with ID {STOPWATCH_ANNOUNCE_CHANNEL_ID}")
-        # Try to find any text channel in the guild
-        for channel in member.guild.text_channels:
-            if channel.permissions_for(member.guild.me).send_messages:
-                announce = channel
-                print(f"DEBUG: Using fallback text channel: {announce.name} ({announce.id})")
-                break
-        if announce is None:
-            print("DEBUG: No text channels found where bot can send messages")
-            return
+        log.warning("No text channel for Stopwatch announcements in %s", member.guild.name)
+        return
 
-    start_time = datetime.datetime.utcnow()
-    user_data[member.id] = {
-        "start_time": start_time,
-        "mode": "stopwatch",
-        "voice_channel": voice_channel.id,
-        "elapsed_seconds": 0
-    }
+    now = scheduler.now() if started_at is None else started_at
+    data = Session(
+        member_id=member.id,
+        guild_id=member.guild.id,
+        profile=profile,
+        voice_channel_id=voice_channel.id,
+        announce_channel_id=announce.id,
+        start_time=mono_to_epoch(now),
+        phase_start=now,
+    )
+    track_session(data)
+
+    if DASHBOARD_MODE:
+        # o cronômetro não tem trocas de fase: o painel cuida de tudo
+        await dashboard_join(member.id, announce)
+        if user_data.get(member.id) is data:
+            persist_session(member.id, data)
+        return
 
     # Envia a mensagem inicial de progresso
     embed = make_embed(
         title="📚 Cronômetro Iniciado",
-        description=f"Continue firme, {member.display_name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!",
+        description=f"Continue firme, {member.display_name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!"
+                    + (f"\n\n{timestamp_lines(data)}" if profile.relative_timestamps else ""),
         color=0x0044AA,  # cor enquanto cronômetro roda
         member=member,
         footer_text="Cronômetro em andamento"
     )
     try:
-        msg = await announce.send(content=f"{member.mention}", embed=embed)
+        msg = await send_to_channel(announce, content=f"{member.mention}", embed=embed)
     except discord.Forbidden:
+        if user_data.get(member.id) is data:
+            untrack_session(member.id)
+        return
+    if user_data.get(member.id) is not data:
         return
-    user_data[member.id]["message"] = msg
+    data.message_id = msg.id
+    persist_session(member.id, data)
 
-    task = asyncio.create_task(stopwatch_loop(member, announce))
-    user_tasks[member.id] = task
+    if not profile.relative_timestamps:  # senão, não há o que atualizar até o fim
+        scheduler.schedule(member.id, scheduler.now(), stopwatch_tick)
 
-async def stopwatch_loop(member: discord.Member, announce_channel: discord.TextChannel):
-    member_id = member.id
-    try:
-        while True:
-            start_time = user_data[member_id]["start_time"]
-            now = datetime.datetime.utcnow()
-            elapsed_seconds = int((now - start_time).total_seconds())
-            user_data[member_id]["elapsed_seconds"] = elapsed_seconds
+async def stopwatch_tick(member_id: int, lateness: float):
+    data = user_data.get(member_id)
+    if data is None or data.mode != "stopwatch":
+        return
 
-            # Atualiza mensagem com tempo decorrido
-            embed = make_embed(
-                title="📚 Cronômetro em Andamento",
-                description=f"Continue firme, {member.display_name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!",
-                color=0x0044AA,
-                member=member,
-                footer_text=f"Tempo decorrido: {fmt_hms(elapsed_seconds)}"
-            )
+    now = scheduler.now()
+    elapsed_seconds = int(now - data.phase_start)
+    data.elapsed_seconds = elapsed_seconds
+    member = session_member(data)
+    name = member_name(data, member)
 
-            msg = user_data[member_id].get("message")
-            try:
-                await msg.edit(content=f"{member.mention}", embed=embed)
-            except (discord.NotFound, discord.Forbidden):
-                # Se a mensagem foi apagada ou não for possível editar, envia uma nova
-                msg = await announce_channel.send(content=f"{member.mention}", embed=embed)
-                user_data[member_id]["message"] = msg
-
-            # Aguarda próxima atualização
-            await asyncio.sleep(STOPWATCH_UPDATE_INTERVAL)
-
-    except asyncio.CancelledError:
-        # Cronômetro interrompido
-        end_time = datetime.datetime.utcnow()
-        start_time = user_data.get(member_id, {}).get("start_time", end_time)
-        total_seconds = int((end_time - start_time).total_seconds())
-
-        # Finaliza cronômetro com mensagem de conclusão personalizada
-        embed = make_embed(
-            title="🎉 Cronômetro Finalizado",
-            description=f"Parabéns, {member.display_name}! Você manteve o foco por {fmt_hms(total_seconds)} — ótimo trabalho investindo em você mesmo(a)!",
-            color=0x22AA55,  # verde final
+    if data.profile.relative_timestamps:
+        # só acontece na recuperação: deixa a mensagem no formato que conta sozinho
+        frame = render_progress(data, member, "stopwatch-timestamps", lambda: (
+            "📚 Cronômetro em Andamento",
+            f"Continue firme, {name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!"
+            f"\n\n{timestamp_lines(data)}",
+            0x0044AA,
+        ), footer_text="Cronômetro em andamento")
+        if frame is not None:
+            update_progress_message(member_id, data, frame)
+        return
+
+    # Atualiza mensagem com tempo decorrido
+    frame = render_progress(data, member, "stopwatch", lambda: (
+        "📚 Cronômetro em Andamento",
+        f"Continue firme, {name}! Você está progredindo — mantenha o foco e aproveite ao máximo esta sessão!",
+        0x0044AA,
+    ), footer_text=f"Tempo decorrido: {fmt_hms(elapsed_seconds)}")
+    if frame is not None:
+        update_progress_message(member_id, data, frame)
+
+    # Aguarda próxima atualização
+    if user_data.get(member_id) is data:
+        next_deadline = next_tick_deadline(data.phase_start, data.profile.update_interval, scheduler.now())
+        scheduler.schedule(member_id, next_deadline, stopwatch_tick)
+
+def finish_stopwatch(member_id: int, data: Session, ended_at: float):
+    # Cronômetro interrompido
+    total_seconds = max(0, int(ended_at - data.phase_start))
+    data.elapsed_seconds = total_seconds
+    record_finished_session(data, ended_at, total_seconds)
+
+    # Finaliza cronômetro com mensagem de conclusão personalizada
+    member = session_member(data)
+    embed = make_embed(
+        title="🎉 Cronômetro Finalizado",
+        description=f"Parabéns, {member_name(data, member)}! Você manteve o foco por {fmt_hms(total_seconds)} — ótimo trabalho investindo em você mesmo(a)!",
+        color=0x22AA55,  # verde final
+        member=member,
+        footer_text="Sessão de cronômetro finalizada"
+    )
+    announce(data, embed)
+
+# ---------------- Utilitário de parada de sessão ----------------
+def track_session(data: Session):
+    """Registra a sessão em user_data e no índice do !status"""
+    user_data[data.member_id] = data
+    session_index.add(data)
+
+def untrack_session(member_id: int) -> Optional[Session]:
+    data = user_data.pop(member_id, None)
+    if data is not None:
+        session_index.remove(member_id)
+    return data
+
+def end_session(member_id: int, ended_at: Optional[float] = None):
+    """Encerra a sessão em `ended_at` (relógio do loop; padrão: agora) e anuncia o total.
+
+    Toda a contabilidade é feita na hora; só o anúncio vai para segundo plano,
+    então quem chama (ex.: a troca de canal) nunca espera a API do Discord.
+    """
+    # Remove o deadline pendente (sem task para cancelar) e a sessão do registro
+    scheduler.cancel(member_id)
+    data = untrack_session(member_id)
+    if data is None:
+        return
+    store.delete(member_id)
+    if DASHBOARD_MODE:
+        dashboard_leave(member_id, data.announce_channel_id)
+    elif data.room is None and data.message_id is not None:
+        # a mensagem de uma sala é da sala: só sai da fila quando ela fecha
+        dispatcher.discard(data.announce_channel_id, message_key(data.message_id))
+    if ended_at is None:
+        ended_at = scheduler.now()
+    if data.room is not None:
+        leave_room(member_id, data, ended_at)
+    elif data.mode == "pomodoro":
+        finish_pomodoro(member_id, data, ended_at)
+    else:
+        finish_stopwatch(member_id, data, ended_at)
+    if data.profile.relative_timestamps and data.room is None and data.message_id is not None and not DASHBOARD_MODE:
+        # a contagem do cliente seguiria rodando: troca por um estado final
+        member = session_member(data)
+        end = mono_to_epoch(ended_at)
+        submit_final_edit(data.announce_channel_id, data.message_id, data.mention, make_embed(
+            title="✅ Sessão Encerrada",
+            description=f"Sessão de {member_name(data, member)} encerrada {discord_timestamp(end, 'R')}.\n"
+                        f"🕒 Das {discord_timestamp(data.start_time, 'T')} às {discord_timestamp(end, 'T')}",
+            color=0x22AA55,
             member=member,
-            footer_text="Sessão de cronômetro finalizada"
-        )
+        ))
+
+def submit_final_edit(channel_id: int, message_id: int, content: str, embed: discord.Embed):
+    """Última edição de uma mensagem de progresso (não depende de a sessão ainda existir)"""
+
+    async def edit():
+        channel = bot.get_channel(channel_id)
+        if channel is not None:
+            await channel.get_partial_message(message_id).edit(content=content, embed=embed)
+
+    # mesma chave dos frames de progresso: substitui um pendente e espera o que está em envio
+    dispatcher.submit_edit(channel_id, message_key(message_id), edit)
+
+def spawn(coro):
+    """Roda `coro` fora do caminho do evento, mantendo a task viva até terminar"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# ---------------- Anúncios ----------------
+# Trocas de fase e fins de sessão de membros que começaram juntos vencem juntos.
+# Em vez de uma mensagem por anúncio, os que chegam dentro de
+# ANNOUNCE_BATCH_WINDOW saem numa mensagem por canal, com as menções no
+# conteúdo e um embed por anúncio.
+def announce(data, embed: discord.Embed):
+    """Agenda o anúncio no canal da sessão ou sala (agrupado, salvo se o perfil pedir entrega individual)"""
+    channel_id = data.announce_channel_id
+    if not data.profile.batch_announcements:
+        announcements.inc("individual")
+        spawn(send_announcements(channel_id, [(data.mention, embed)]))
+        return
+    announcements.inc("batched")
+    pending_announcements.setdefault(channel_id, []).append((data.mention, embed))
+    key = ("announce", channel_id)
+    if key not in scheduler:
+        scheduler.schedule_in(key, ANNOUNCE_BATCH_WINDOW, flush_announcements)
+
+async def flush_announcements(key, lateness: float):
+    items = pending_announcements.pop(key[1], None)
+    if items:
+        await send_announcements(key[1], items)
+
+def announcement_chunks(items):
+    """Divide [(menção, embed)] em mensagens dentro dos limites de embeds e de caracteres"""
+    chunk, size, content = [], 0, 0
+    for mention, embed in items:
+        length = len(embed)
+        if chunk and (len(chunk) >= EMBEDS_PER_MESSAGE or size + length > EMBED_TOTAL_LIMIT
+                      or content + len(mention) + 1 > CONTENT_LIMIT):
+            yield chunk
+            chunk, size, content = [], 0, 0
+        chunk.append((mention, embed))
+        size += length
+        content += len(mention) + 1
+    if chunk:
+        yield chunk
+
+async def send_announcements(channel_id: int, items):
+    channel = bot.get_channel(channel_id)
+    if channel is None:
+        return
+    for chunk in announcement_chunks(items):
+        # dict.fromkeys: uma menção por membro, na ordem dos anúncios
+        content = " ".join(dict.fromkeys(mention for mention, _ in chunk))
         try:
-            await announce_channel.send(content=f"{member.mention}", embed=embed)
+            await send_to_channel(channel, content=content, embeds=[embed for _, embed in chunk])
         except discord.Forbidden:
-            pass
+            return
+        except discord.HTTPException as e:
+            log.warning("Falha ao enviar %d anúncio(s) no canal %s: %r", len(chunk), channel_id, e)
 
-        # limpeza
-        user_tasks.pop(member_id, None)
-        user_data.pop(member_id, None)
-        return
+# ---------------- Comandos opcionais ----------------
+STATUS_PAGE_SIZE = 15
+STATUS_VIEW_TIMEOUT = 180  # segundos com os botões de página ativos
+STATUS_MODES = {"pomodoro": "pomodoro", "cronometro": "stopwatch", "cronômetro": "stopwatch", "stopwatch": "stopwatch"}
+STATUS_MODE_LABELS = {"pomodoro": "Pomodoro", "stopwatch": "Cronômetro"}
+STATUS_USAGE = (
+    "Uso: `!status [pomodoro|cronometro] [#canal-de-voz] [min=30m]` — "
+    "filtra por modo, canal de voz e tempo mínimo de sessão (ex.: `45m`, `1h30m`)"
+)
 
-# ---------------- Utilitário de parada de sessão ----------------
-async def stop_session(member: discord.Member, reason: str = ""):
-    """Para qualquer sessão ativa do usuário"""
-    if member.id in user_tasks:
-        task = user_tasks[member.id]
-        task.cancel()
-        # A limpeza será feita no except asyncio.CancelledError de cada loop
+def parse_duration(text: str) -> Optional[int]:
+    """'1h30m', '45m', '90s' ou só minutos ('20') -> segundos; None se não for uma duração"""
+    match = re.fullmatch(r"(?:(\d+)h)?(?:(\d+)m(?:in)?)?(?:(\d+)s)?", text)
+    if text.isdigit():
+        return int(text) * 60
+    if not text or match is None:
+        return None
+    hours, minutes, seconds = (int(g) if g else 0 for g in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+def parse_status_filters(guild: discord.Guild, args) -> dict:
+    """Filtros do !status; ValueError com a mensagem para o usuário se algo não for reconhecido"""
+    filters = {"mode": None, "channel_id": None, "min_elapsed": 0}
+    for arg in args:
+        token = arg.strip().lower()
+        if token in STATUS_MODES:
+            filters["mode"] = STATUS_MODES[token]
+            continue
+        for prefix in ("min=", ">=", ">"):
+            if token.startswith(prefix):
+                token = token[len(prefix):]
+                break
+        else:
+            channel_id = token.strip("<#>")
+            if channel_id.isdigit() and len(channel_id) > 6:
+                channel = guild.get_channel(int(channel_id))
+            else:
+                channel = discord.utils.find(lambda c: c.name.lower() == token, guild.voice_channels)
+            if channel is not None:
+                filters["channel_id"] = channel.id
+                continue
+        seconds = parse_duration(token)
+        if seconds is None:
+            raise ValueError(f"Filtro não reconhecido: `{arg}`\n{STATUS_USAGE}")
+        filters["min_elapsed"] = seconds
+    return filters
+
+def status_line(guild: discord.Guild, data: Session, now: float) -> str:
+    name = discord.utils.escape_markdown(member_name(data, guild.get_member(data.member_id)))
+    mode = STATUS_MODE_LABELS.get(data.mode, data.mode)
+    if data.room is not None:
+        mode += " · sala"
+    if data.mode == "pomodoro":
+        cycle = data.room if data.room is not None else data
+        mode += " · foco" if cycle.cycle_phase == "focus" else " · pausa"
+    return f"• **{name}** — {mode} · <#{data.voice_channel_id}> · {fmt_hms(int(now - data.start_time))}"
+
+class StatusPages(discord.ui.View):
+    """Páginas do !status; cada página é lida do índice na hora em que aparece"""
+
+    def __init__(self, author_id: int, guild: discord.Guild, filters: dict, footer_text: str):
+        super().__init__(timeout=STATUS_VIEW_TIMEOUT)
+        self.author_id = author_id
+        self.guild = guild
+        self.filters = filters
+        self.footer_text = footer_text
+        self.page = 0
+        self.pages = 1
+        self.total = 0
+        self.message: Optional[discord.Message] = None
+
+    def render(self) -> discord.Embed:
+        now = time.time()
+        mode, channel_id, min_elapsed = self.filters["mode"], self.filters["channel_id"], self.filters["min_elapsed"]
+        started_before = now - min_elapsed if min_elapsed else None
+        self.total = session_index.count(self.guild.id, mode, channel_id, started_before)
+        self.pages = max(1, -(-self.total // STATUS_PAGE_SIZE))
+        self.page = min(self.page, self.pages - 1)
+        member_ids = session_index.page(self.guild.id, self.page * STATUS_PAGE_SIZE, STATUS_PAGE_SIZE,
+                                        mode, channel_id, started_before)
+        lines = [status_line(self.guild, user_data[mid], now) for mid in member_ids if mid in user_data]
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+        applied = []
+        if mode:
+            applied.append(STATUS_MODE_LABELS[mode])
+        if channel_id:
+            applied.append(f"<#{channel_id}>")
+        if min_elapsed:
+            applied.append(f"≥ {fmt_hms(min_elapsed)}")
+        description = "\n".join(lines) or "Nenhuma sessão com esses filtros."
+        if applied:
+            description = f"Filtros: {' · '.join(applied)}\n\n{description}"
+        return make_embed(
+            title=f"Sessões Ativas ({self.total})",
+            description=description,
+            color=0x0055AA,
+            footer_text=f"Página {self.page + 1}/{self.pages} · {self.footer_text}"
+        )
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Só quem usou o `!status` pode trocar de página.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="◀ Anterior", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = max(0, self.page - 1)
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(label="Próxima ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    async def on_timeout(self):
+        if self.message is None:
+            return
+        for item in self.children:
+            item.disabled = True
         try:
-            await task
-        except asyncio.CancelledError:
+            await self.message.edit(view=self)
+        except discord.HTTPException:
             pass
 
-# ---------------- Comandos opcionais ----------------
 @bot.command(name="status")
-async def status_command(ctx):
-    """Comando para verificar sessões ativas"""
-    if not user_data:
-        await ctx.send("Nenhuma sessão ativa no momento.")
+@commands.guild_only()
+async def status_command(ctx, *filtros: str):
+    """Sessões ativas deste servidor, em páginas; filtros: modo, canal de voz, tempo mínimo"""
+    try:
+        filters = parse_status_filters(ctx.guild, filtros)
+    except ValueError as e:
+        await ctx.send(str(e))
         return
-    
-    active_sessions = []
-    for member_id, data in user_data.items():
-        member = ctx.guild.get_member(member_id)
-        if member:
-            mode = data.get("mode", "unknown")
-            start_time = data.get("start_time")
-            if start_time:
-                elapsed = int((datetime.datetime.utcnow() - start_time).total_seconds())
-                active_sessions.append(f"• {member.display_name}: {mode} ({fmt_hms(elapsed)})")
-    
-    if active_sessions:
-        embed = make_embed(
-            title="Sessões Ativas",
-            description="\n".join(active_sessions),
-            color=0x0055AA
-        )
+
+    # este servidor é sempre do processo que recebeu o comando; os outros
+    # processos entram só no total, com as contagens do último flush de cada
+    # um em `owners` (as deste processo são as de agora)
+    cluster = await asyncio.to_thread(store.cluster_summary, time.time() - CLUSTER_ALIVE_WINDOW)
+    cluster.setdefault(store.owner_id, {})["sessions"] = session_index.mode_counts()
+    totals = collections.Counter()
+    for owner in cluster.values():
+        totals.update(owner["sessions"])
+    cluster_text = (
+        f"Em todos os processos: {sum(totals.values())} sessão(ões) — "
+        f"{totals.get('pomodoro', 0)} Pomodoro · {totals.get('stopwatch', 0)} Cronômetro · "
+        f"{len(cluster)} processo(s)"
+    )
+
+    if not filtros and session_index.count(ctx.guild.id) == 0:
+        await ctx.send(f"Nenhuma sessão ativa no momento.\n{cluster_text}")
+        return
+    view = StatusPages(ctx.author.id, ctx.guild, filters, cluster_text)
+    embed = view.render()
+    if view.pages <= 1:
         await ctx.send(embed=embed)
-    else:
-        await ctx.send("Nenhuma sessão ativa no momento.")
+        return
+    view.message = await ctx.send(embed=embed, view=view)
+
+STATS_PERIODS = {
+    "dia": ("day", "Hoje"),
+    "semana": ("week", "Esta semana"),
+    "mes": ("month", "Este mês"),
+    "mês": ("month", "Este mês"),
+    "total": ("all", "Total"),
+}
+
+@bot.command(name="stats")
+@commands.guild_only()
+async def stats_command(ctx, member: Optional[discord.Member] = None):
+    """Comando para ver o tempo de foco acumulado de um membro"""
+    member = member or ctx.author
+    # só leitura: sessões recém-terminadas entram no próximo flush periódico
+    stats = await asyncio.to_thread(store.member_stats, ctx.guild.id, member.id)
+
+    lines = []
+    for label, (period, title) in STATS_PERIODS.items():
+        if label == "mês":
+            continue
+        seconds, sessions = stats[period]
+        lines.append(f"**{title}:** {fmt_hms(seconds)} em {sessions} sessão(ões)")
+    embed = make_embed(
+        title=f"Estatísticas de {member.display_name}",
+        description="\n".join(lines),
+        color=0x0055AA,
+        member=member
+    )
+    await ctx.send(embed=embed)
+
+@bot.command(name="rank")
+@commands.guild_only()
+async def rank_command(ctx, periodo: str = "semana"):
+    """Comando para ver o ranking de foco do servidor"""
+    if periodo.lower() not in STATS_PERIODS:
+        await ctx.send("Período inválido. Use `dia`, `semana`, `mes` ou `total`.")
+        return
+    period, title = STATS_PERIODS[periodo.lower()]
+    top = await asyncio.to_thread(store.leaderboard, ctx.guild.id, period, 10)
+    mine = await asyncio.to_thread(store.member_rank, ctx.guild.id, ctx.author.id, period)
+
+    if not top:
+        await ctx.send("Ainda não há tempo de foco registrado neste período.")
+        return
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    lines = []
+    for position, (member_id, seconds, sessions) in enumerate(top, start=1):
+        member = ctx.guild.get_member(member_id)
+        name = member.display_name if member else f"<@{member_id}>"
+        lines.append(f"{medals.get(position, f'{position}.')} {name} — {fmt_hms(seconds)}")
+    footer = None
+    if mine is not None:
+        footer = f"Sua posição: {mine[0]}º com {fmt_hms(mine[1])}"
+    embed = make_embed(
+        title=f"Ranking — {title}",
+        description="\n".join(lines),
+        color=0x0055AA,
+        footer_text=footer
+    )
+    await ctx.send(embed=embed)
+
+@bot.command(name="reload")
+@commands.has_permissions(manage_guild=True)
+async def reload_command(ctx):
+    """Comando para recarregar o arquivo de roteamento dos canais"""
+    try:
+        table = reload_routing()
+    except (OSError, RoutingError) as e:
+        await ctx.send(f"❌ Configuração inválida, mantendo a anterior: {e}")
+        return
+    await ctx.send(f"✅ Roteamento recarregado: {len(table)} canal(is) de voz, {len(table.profiles)} perfil(is).")
+
+# --- exportação/importação do histórico (ver history_io.py) ---
+HISTORY_BATCH_SIZE = 1000  # linhas por consulta/transação
+EXPORT_PART_BYTES = 8 * 1024 * 1024  # tamanho máximo de cada anexo (abaixo do limite padrão de upload)
+EXPORT_USAGE = (
+    "Uso: `!export [csv|jsonl] [@membro] [AAAA-MM-DD] [AAAA-MM-DD]` — "
+    "histórico deste servidor, opcionalmente de um membro e entre duas datas (inclusive)"
+)
+
+def parse_export_args(args) -> dict:
+    """Argumentos do !export; ValueError com a mensagem para o usuário se algo não for reconhecido"""
+    options = {"fmt": "csv", "member_id": None, "days": []}
+    for arg in args:
+        token = arg.strip().lower()
+        if token in ("csv", "jsonl"):
+            options["fmt"] = token
+        elif re.fullmatch(r"<@!?\d+>|\d{15,}", token):
+            options["member_id"] = int(token.strip("<@!>"))
+        elif re.fullmatch(r"\d{4}-\d{2}-\d{2}", token) and len(options["days"]) < 2:
+            options["days"].append(token)
+        else:
+            raise ValueError(f"Argumento não reconhecido: `{arg}`\n{EXPORT_USAGE}")
+    since, until = (options["days"] + [None, None])[:2]
+    options["since"], options["until"] = day_range(since, until, STATS_UTC_OFFSET_HOURS)
+    return options
+
+@bot.command(name="export")
+@commands.guild_only()
+@commands.has_permissions(manage_guild=True)
+async def export_command(ctx, *args: str):
+    """Comando para exportar o histórico de sessões do servidor (CSV ou JSON Lines, em anexos)"""
+    try:
+        options = parse_export_args(args)
+    except ValueError as e:
+        await ctx.send(str(e))
+        return
+    if ctx.guild.id in history_jobs:
+        await ctx.send("Já há uma exportação/importação em andamento neste servidor.")
+        return
+    history_jobs.add(ctx.guild.id)
+    try:
+        await store.flush()  # inclui sessões que acabaram de terminar
+        batches = store.iter_history(guild_id=ctx.guild.id, member_id=options["member_id"],
+                                     since=options["since"], until=options["until"],
+                                     batch_size=HISTORY_BATCH_SIZE)
+        # uma parte por vez, escrita numa thread: memória e disco limitados a um anexo
+        export = ChunkedExport(batches, options["fmt"], min(EXPORT_PART_BYTES, ctx.guild.filesize_limit),
+                               f"historico-{ctx.guild.id}")
+        while True:
+            part = await asyncio.to_thread(export.next_part)
+            if part is None:
+                break
+            fp, filename, rows = part
+            with fp:
+                await ctx.send(f"Parte {export.parts}: {rows} sessão(ões)", file=discord.File(fp, filename=filename))
+        history_rows.inc("export", amount=export.rows)
+    finally:
+        history_jobs.discard(ctx.guild.id)
+    if export.parts == 0:
+        await ctx.send("Nenhuma sessão registrada com esses filtros.")
+        return
+    await ctx.send(f"✅ {export.rows} sessão(ões) exportada(s) em {export.parts} arquivo(s).")
+
+def import_attachment(fp, fmt: str, guild_id: int):
+    """Importa um anexo já baixado (roda numa thread); tudo vai para o servidor do comando"""
+    text = io.TextIOWrapper(fp, encoding="utf-8-sig", newline="")
+    return store.import_history(read_history(text, fmt, guild_id=guild_id), batch_size=HISTORY_BATCH_SIZE)
+
+@bot.command(name="import")
+@commands.guild_only()
+@commands.has_permissions(manage_guild=True)
+async def import_command(ctx):
+    """Comando para importar histórico de um anexo .csv/.jsonl (sessões repetidas são ignoradas)"""
+    if not ctx.message.attachments:
+        await ctx.send("Anexe um arquivo `.csv` ou `.jsonl` exportado pelo `!export` ou pelo `history_cli.py`.")
+        return
+    attachment = ctx.message.attachments[0]
+    try:
+        fmt = format_from_name(attachment.filename)
+    except ValueError as e:
+        await ctx.send(f"❌ {e}")
+        return
+    if ctx.guild.id in history_jobs:
+        await ctx.send("Já há uma exportação/importação em andamento neste servidor.")
+        return
+    history_jobs.add(ctx.guild.id)
+    try:
+        with tempfile.TemporaryFile() as fp:
+            await attachment.save(fp)
+            fp.seek(0)
+            imported, skipped = await asyncio.to_thread(import_attachment, fp, fmt, ctx.guild.id)
+    except ValueError as e:
+        # os lotes anteriores ao erro já foram gravados; reenviar o arquivo corrigido pula o que já existe
+        await ctx.send(f"❌ Arquivo inválido, importação interrompida: {e}")
+        return
+    finally:
+        history_jobs.discard(ctx.guild.id)
+    history_rows.inc("import", amount=imported)
+    await ctx.send(f"✅ {imported} sessão(ões) importada(s) · {skipped} já existiam.")
 
 @bot.command(name="info")
 async def info_command(ctx):
@@ -450,9 +1860,13 @@ async def info_command(ctx):
             "🍅 **Pomodoro**: Entre no canal de voz configurado para iniciar ciclos automáticos de 25min foco + 5min pausa\n"
             "⏱️ **Cronômetro**: Entre no outro canal de voz configurado para cronometrar tempo livre\n"
             "📊 **Comandos**:\n"
-            "• `!status` - Ver sessões ativas\n"
+            "• `!status [pomodoro|cronometro] [#canal] [min=30m]` - Sessões ativas do servidor, em páginas\n"
+            "• `!stats [@membro]` - Tempo de foco no dia, semana, mês e total\n"
+            "• `!rank [dia|semana|mes|total]` - Ranking do servidor\n"
             "• `!info` - Esta mensagem\n"
-            "• `!debug` - Verificar configuração dos canais\n\n"
+            "• `!debug` - Verificar configuração dos canais\n"
+            "• `!reload` - Recarregar a configuração dos canais (administradores)\n"
+            "• `!export [csv|jsonl] [@membro] [desde] [até]` / `!import` - Exportar/importar o histórico (administradores)\n\n"
             "O bot detecta automaticamente quando você entra/sai dos canais!"
         ),
         color=0x0055AA
@@ -464,34 +1878,59 @@ async def debug_command(ctx):
     """Comando para debugar configuração dos canais"""
     guild = ctx.guild
     
-    # Check Pomodoro channels
-    pomodoro_voice = guild.get_channel(POMODORO_VOICE_ID)
-    pomodoro_announce = get_announcement_channel(guild, POMODORO_ANNOUNCE_CHANNEL_ID)
-    
-    # Check Stopwatch channels  
-    stopwatch_voice = guild.get_channel(STOPWATCH_VOICE_ID)
-    stopwatch_announce = get_announcement_channel(guild, STOPWATCH_ANNOUNCE_CHANNEL_ID)
-    
     debug_info = []
-    debug_info.append(f"**Configuração dos Canais:**")
-    debug_info.append(f"Pomodoro Voice: {pomodoro_voice.name if pomodoro_voice else 'Não encontrado'} ({POMODORO_VOICE_ID})")
-    debug_info.append(f"Pomodoro Text: {pomodoro_announce.name if pomodoro_announce else 'Não encontrado'} ({POMODORO_ANNOUNCE_CHANNEL_ID})")
-    debug_info.append(f"Stopwatch Voice: {stopwatch_voice.name if stopwatch_voice else 'Não encontrado'} ({STOPWATCH_VOICE_ID})")  
-    debug_info.append(f"Stopwatch Text: {stopwatch_announce.name if stopwatch_announce else 'Não encontrado'} ({STOPWATCH_ANNOUNCE_CHANNEL_ID})")
-    
-    debug_info.append(f"\n**Permissões do Bot:**")
-    if pomodoro_announce:
-        perms = pomodoro_announce.permissions_for(guild.me)
-        debug_info.append(f"Send Messages (Pomodoro): {perms.send_messages}")
-        debug_info.append(f"Embed Links (Pomodoro): {perms.embed_links}")
+    shard_count, shard_ids = owned_shards()
+    debug_info.append(
+        f"**Processo:** {PROCESS_ID} · shards {', '.join(map(str, shard_ids)) if shard_ids else 'todos'} "
+        f"de {shard_count} · este servidor: shard {shard_of(guild.id, shard_count)}"
+    )
+    debug_info.append(f"**Configuração dos Canais:** ({routing.path if routing.mtime else 'padrão'})")
+    for voice_id, profile in routing.routes.items():
+        voice = guild.get_channel(voice_id)
+        if voice is None:
+            continue  # canal de outro servidor
+        announce = get_announcement_channel(guild, profile.announce_channel_id)
+        debug_info.append(
+            f"{voice.name} ({voice_id}) → {profile.name} [{profile.mode}{' · sala' if profile.shared_room else ''}] · "
+            f"Texto: {announce.name if announce else 'Não encontrado'} ({profile.announce_channel_id})"
+        )
+        if announce:
+            perms = announce.permissions_for(guild.me)
+            debug_info.append(f"  Send Messages: {perms.send_messages} · Embed Links: {perms.embed_links}")
+
+    debug_info.append(f"\n**Cache de Canais de Anúncio:**")
+    debug_info.append(
+        f"Acertos: {announce_cache_stats['hits']} · Falhas: {announce_cache_stats['misses']} · "
+        f"Invalidações: {announce_cache_stats['invalidations']}"
+    )
+
+    debug_info.append(f"\n**Renderização:**")
+    debug_info.append(f"Edições geradas: {render_stats['sent']} · Suprimidas (sem mudança visível): {render_stats['suppressed']}")
+
+    stats = dispatcher.stats()
+    debug_info.append(f"\n**Fila de Edições:**")
+    debug_info.append(f"Enviadas: {stats['sent']} · Descartadas (frame mais novo): {stats['dropped']} · Pendentes: {stats['pending']}")
+    debug_info.append(f"Rate limits (429): {stats['rate_limited']} · Falhas: {stats['failed']}")
+    debug_info.append(f"Espera na fila: p50 {stats['wait_p50']:.2f}s · p95 {stats['wait_p95']:.2f}s · máx {stats['wait_max']:.2f}s")
+
+    debug_info.append(f"\n**Métricas:**")
+    endpoint = f"http://{METRICS_HOST}:{METRICS_PORT}/metrics" if METRICS_PORT else "desligado"
+    debug_info.append(f"Endpoint: {endpoint} · Atraso do loop: {loop_lag.last * 1000:.1f}ms · Log: {LOG_LEVEL}")
     
     await ctx.send("\n".join(debug_info))
 
 # ---------------- Inicialização ----------------
 if __name__ == "__main__":
+    log_listener = setup_logging(LOG_LEVEL, DISCORD_LOG_LEVEL)
     try:
-        bot.run(TOKEN)
+        # log_handler=None: o discord.py usa a mesma fila de logs em vez do próprio handler
+        bot.run(TOKEN, log_handler=None)
     except discord.LoginFailure:
-        print("❌ Token inválido! Verifique a variável DISCORD_BOT_TOKEN")
-    except Exception as e:
-        print(f"❌ Erro ao iniciar o bot: {e}")
+        log.error("❌ Token inválido! Verifique a variável DISCORD_BOT_TOKEN")
+    except Exception:
+        log.exception("❌ Erro ao iniciar o bot")
+    finally:
+        # grava o que ficou no buffer; as sessões voltam no próximo início
+        store.set_session_counts(session_index.mode_counts())
+        store.close()
+        log_listener.stop()
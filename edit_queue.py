@@ -0,0 +1,388 @@
+# edit_queue.py
+"""Fila de edições de mensagens com orçamento por canal/rota.
+
+Cada mensagem tem no máximo um "frame" pendente: se um frame mais novo chega
+antes do anterior sair, o antigo é descartado (o último frame vence). Um único
+sender respeita um token bucket por (canal, rota) e um global, enviando o estado
+mais recente assim que houver orçamento, em vez de deixar o discord.py dormir
+no backoff de rate limit dentro dos loops das sessões.
+
+O HTTPClient do discord.py trata os 429 sozinho: registra um aviso no logger
+"discord.http", dorme o retry_after e tenta de novo, e só levanta exceção
+depois de esgotar as tentativas. Por isso os 429 são contados pelo aviso
+(`watch_rate_limits`), e não pela exceção.
+"""
+import asyncio
+import collections
+import logging
+import re
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+from metrics import Histogram
+
+log = logging.getLogger("pomoallos.edit_queue")
+
+# Limites padrão (tokens, janela em segundos) — próximos aos buckets do Discord
+EDIT_RATE = (5, 5.0)     # PATCH /channels/{id}/messages/{id}
+SEND_RATE = (5, 5.0)     # POST  /channels/{id}/messages
+GLOBAL_RATE = (50, 1.0)  # limite global do bot
+MAX_IN_FLIGHT = 16       # edições HTTP simultâneas
+
+ROUTE_EDIT = "edit"
+ROUTE_SEND = "send"
+
+# avisos do discord.py a cada 429: (método, url, retry_after) e, no limite global, (retry_after,)
+RATE_LIMIT_LOG_PREFIX = "We are being rate limited."
+GLOBAL_RATE_LIMIT_LOG_PREFIX = "Global rate limit has been hit."
+_CHANNEL_URL = re.compile(r"/channels/(\d+)(/[^?]*)?(?:\?.*)?$")
+_MESSAGE_PATH = re.compile(r"/messages/\d+")
+
+Factory = Callable[[], Awaitable[Any]]
+ErrorHandler = Callable[[BaseException], Awaitable[None]]
+
+
+class TokenBucket:
+    __slots__ = ("capacity", "rate", "tokens", "updated", "blocked_until")
+
+    def __init__(self, capacity: int, per: float, now: float):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.tokens = float(capacity)
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Segundos até haver um token disponível (0 = pode enviar agora)."""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def penalize(self, now: float, retry_after: float):
+        self.tokens = 0.0
+        self.updated = now
+        self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+class _Frame:
+    __slots__ = ("factory", "on_error", "enqueued_at")
+
+    def __init__(self, factory: Factory, on_error: Optional[ErrorHandler], enqueued_at: float):
+        self.factory = factory
+        self.on_error = on_error
+        self.enqueued_at = enqueued_at
+
+
+class ChannelStats:
+    __slots__ = ("edits", "sends", "dropped", "rate_limited")
+
+    def __init__(self):
+        self.edits = 0
+        self.sends = 0
+        self.dropped = 0
+        self.rate_limited = 0
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Retorna o retry_after de um 429 (discord.HTTPException ou similar)."""
+    if getattr(exc, "status", None) != 429:
+        return None
+    retry = getattr(exc, "retry_after", None)
+    if retry is None:
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        try:
+            retry = float(headers.get("Retry-After", 1.0))
+        except (TypeError, ValueError):
+            retry = 1.0
+    return float(retry)
+
+
+class RateLimitLogFilter(logging.Filter):
+    """Conta os 429 avisados pelo discord.py por canal e penaliza o bucket da rota.
+
+    Todo 429 numa rota de canal entra na contagem do canal; os de edição e
+    envio de mensagem também penalizam o bucket: enquanto o discord.py espera
+    para tentar de novo, a edição segue dentro de `factory()`, e a penalidade
+    faz o sender parar de lançar frames nesse canal até o retry_after passar.
+    `min_level` preserva o nível configurado do logger (ver
+    `EditDispatcher.watch_rate_limits`).
+    """
+
+    def __init__(self, dispatcher: "EditDispatcher", min_level: int = logging.NOTSET):
+        super().__init__()
+        self.dispatcher = dispatcher
+        self.min_level = min_level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        msg = record.msg if isinstance(record.msg, str) else ""
+        if msg.startswith(RATE_LIMIT_LOG_PREFIX) and isinstance(record.args, tuple) and len(record.args) >= 3:
+            method, url, retry_after = record.args[:3]
+            match = _CHANNEL_URL.search(str(url))
+            if match is not None:
+                path = match.group(2) or ""
+                route = None
+                if method == "PATCH" and _MESSAGE_PATH.fullmatch(path):
+                    route = ROUTE_EDIT
+                elif method == "POST" and path == "/messages":
+                    route = ROUTE_SEND
+                self.dispatcher.observe_rate_limit(int(match.group(1)), route, float(retry_after))
+        elif msg.startswith(GLOBAL_RATE_LIMIT_LOG_PREFIX):
+            self.dispatcher.global_rate_limited += 1
+        return record.levelno >= self.min_level
+
+
+class EditDispatcher:
+    def __init__(self, edit_rate: Tuple[int, float] = EDIT_RATE, send_rate: Tuple[int, float] = SEND_RATE,
+                 global_rate: Tuple[int, float] = GLOBAL_RATE, max_in_flight: int = MAX_IN_FLIGHT):
+        self.rates = {ROUTE_EDIT: edit_rate, ROUTE_SEND: send_rate}
+        self.global_rate = global_rate
+        self.max_in_flight = max_in_flight
+        self._buckets: Dict[Tuple[int, str], TokenBucket] = {}
+        self._global: Optional[TokenBucket] = None
+        # channel_id -> {message_key: frame}, na ordem em que ficaram pendentes
+        self._pending: Dict[int, "collections.OrderedDict[Hashable, _Frame]"] = {}
+        self._in_flight: set = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._sender: Optional[asyncio.Task] = None
+        self._calls: set = set()
+        self.watching_rate_limits = False
+        # estatísticas
+        self.channels: Dict[int, ChannelStats] = collections.defaultdict(ChannelStats)
+        self.submitted = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.global_rate_limited = 0
+        self.wait_samples: Deque[float] = collections.deque(maxlen=1024)
+        self.max_wait = 0.0
+        self.latency = Histogram("pomoallos_api_latency_seconds",
+                                 "Duração das chamadas HTTP de edição e envio de mensagens", ("route",))
+        self.queue_wait = Histogram("pomoallos_edit_queue_wait_seconds",
+                                    "Tempo que um frame de edição esperou por orçamento na fila")
+
+    # --- ciclo de vida ---
+    def start(self):
+        if self._sender is None or self._sender.done():
+            self._wakeup = asyncio.Event()
+            self._sender = asyncio.create_task(self._run(), name="edit-dispatcher")
+
+    async def stop(self):
+        if self._sender is not None:
+            self._sender.cancel()
+            try:
+                await self._sender
+            except asyncio.CancelledError:
+                pass
+            self._sender = None
+
+    # --- orçamento ---
+    @staticmethod
+    def _now() -> float:
+        return asyncio.get_running_loop().time()
+
+    def _bucket(self, channel_id: int, route: str, now: float) -> TokenBucket:
+        key = (channel_id, route)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            capacity, per = self.rates[route]
+            bucket = self._buckets[key] = TokenBucket(capacity, per, now)
+        return bucket
+
+    def _global_bucket(self, now: float) -> TokenBucket:
+        if self._global is None:
+            self._global = TokenBucket(*self.global_rate, now)
+        return self._global
+
+    def _delay(self, channel_id: int, route: str, now: float) -> float:
+        return max(self._bucket(channel_id, route, now).delay(now), self._global_bucket(now).delay(now))
+
+    def _consume(self, channel_id: int, route: str, now: float):
+        self._bucket(channel_id, route, now).consume(now)
+        self._global_bucket(now).consume(now)
+
+    # --- API ---
+    def submit_edit(self, channel_id: int, message_key: Hashable, factory: Factory,
+                    on_error: Optional[ErrorHandler] = None):
+        """Enfileira o frame mais recente de uma mensagem; descarta o pendente anterior."""
+        now = self._now()
+        self.submitted += 1
+        queue = self._pending.get(channel_id)
+        if queue is None:
+            queue = self._pending[channel_id] = collections.OrderedDict()
+        if message_key in queue:
+            # mantém a posição na fila, troca só o conteúdo
+            self.dropped += 1
+            self.channels[channel_id].dropped += 1
+        queue[message_key] = _Frame(factory, on_error, now)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def discard(self, channel_id: int, message_key: Hashable):
+        """Remove um frame pendente (ex.: sessão encerrada antes do envio)."""
+        queue = self._pending.get(channel_id)
+        if queue is not None and queue.pop(message_key, None) is not None:
+            self.dropped += 1
+            self.channels[channel_id].dropped += 1
+
+    async def send(self, channel_id: int, factory: Factory) -> Any:
+        """Envia uma mensagem nova respeitando o orçamento da rota de envio."""
+        while True:
+            now = self._now()
+            delay = self._delay(channel_id, ROUTE_SEND, now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            self._consume(channel_id, ROUTE_SEND, now)
+            try:
+                result = await factory()
+            except Exception as exc:
+                retry = _retry_after(exc)
+                if retry is None:
+                    raise
+                self._on_rate_limited(channel_id, ROUTE_SEND, retry, count=not self.watching_rate_limits)
+                continue
+            self.latency.observe(self._now() - now, ROUTE_SEND)
+            self.channels[channel_id].sends += 1
+            return result
+
+    def watch_rate_limits(self, logger: logging.Logger):
+        """Conta os 429 pelo aviso que o discord.py registra em `logger` ("discord.http").
+
+        Filtros de logger só rodam para registros do nível habilitado: se o
+        logger estiver acima de WARNING, ele desce para WARNING e o filtro
+        descarta o que antes não apareceria.
+        """
+        level = logger.getEffectiveLevel()
+        if level > logging.WARNING:
+            logger.setLevel(logging.WARNING)
+        logger.addFilter(RateLimitLogFilter(self, level))
+        self.watching_rate_limits = True
+
+    def observe_rate_limit(self, channel_id: int, route: Optional[str], retry_after: float):
+        """Um 429 recebido numa chamada que o discord.py vai repetir sozinho (rota None: só conta)."""
+        if route is None:
+            self.rate_limited += 1
+            self.channels[channel_id].rate_limited += 1
+            return
+        self._on_rate_limited(channel_id, route, retry_after)
+
+    def pending_count(self) -> int:
+        return sum(len(q) for q in self._pending.values())
+
+    def stats(self) -> dict:
+        samples = sorted(self.wait_samples)
+
+        def pct(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))] if samples else 0.0
+
+        return {
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "rate_limited": self.rate_limited,
+            "pending": self.pending_count(),
+            "wait_p50": pct(0.50),
+            "wait_p95": pct(0.95),
+            "wait_max": self.max_wait,
+        }
+
+    # --- internos ---
+    def _on_rate_limited(self, channel_id: int, route: str, retry_after: float, count: bool = True):
+        now = self._now()
+        if count:
+            self.rate_limited += 1
+            self.channels[channel_id].rate_limited += 1
+        self._bucket(channel_id, route, now).penalize(now, retry_after)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            next_wake: Optional[float] = None
+
+            for channel_id in list(self._pending):
+                queue = self._pending[channel_id]
+                while queue and len(self._in_flight) < self.max_in_flight:
+                    delay = self._delay(channel_id, ROUTE_EDIT, now)
+                    if delay > 0:
+                        wake = now + delay
+                        next_wake = wake if next_wake is None else min(next_wake, wake)
+                        break
+                    key = next((k for k in queue if (channel_id, k) not in self._in_flight), None)
+                    if key is None:
+                        break  # só restam mensagens com edição em andamento
+                    frame = queue.pop(key)
+                    self._consume(channel_id, ROUTE_EDIT, now)
+                    self._launch(channel_id, key, frame, now)
+                if not queue:
+                    del self._pending[channel_id]
+
+            timeout = None if next_wake is None else max(0.0, next_wake - loop.time())
+            # asyncio.timeout, não wait_for: no 3.11 o wait_for engole o
+            # cancelamento do stop() se o evento disparar no mesmo instante
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+
+    def _launch(self, channel_id: int, key: Hashable, frame: _Frame, now: float):
+        waited = now - frame.enqueued_at
+        self.wait_samples.append(waited)
+        self.queue_wait.observe(waited)
+        if waited > self.max_wait:
+            self.max_wait = waited
+        slot = (channel_id, key)
+        self._in_flight.add(slot)
+        task = asyncio.create_task(self._perform(channel_id, key, frame))
+        self._calls.add(task)
+        task.add_done_callback(self._calls.discard)
+
+    async def _perform(self, channel_id: int, key: Hashable, frame: _Frame):
+        started = self._now()
+        try:
+            await frame.factory()
+            self.latency.observe(self._now() - started, ROUTE_EDIT)
+            self.sent += 1
+            self.channels[channel_id].edits += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            retry = _retry_after(exc)
+            if retry is not None:
+                # com o aviso do discord.py observado, cada 429 já foi contado; a
+                # exceção só chega quando as tentativas dele se esgotaram
+                self._on_rate_limited(channel_id, ROUTE_EDIT, retry, count=not self.watching_rate_limits)
+                # reenfileira só se nenhum frame mais novo chegou nesse meio tempo
+                queue = self._pending.setdefault(channel_id, collections.OrderedDict())
+                if key not in queue:
+                    queue[key] = frame
+                    queue.move_to_end(key, last=False)
+            else:
+                self.failed += 1
+                if frame.on_error is not None:
+                    try:
+                        await frame.on_error(exc)
+                    except Exception:
+                        log.exception("Erro ao tratar falha de edição da mensagem %s", key)
+                else:
+                    log.warning("Falha ao editar mensagem %s: %r", key, exc)
+        finally:
+            self._in_flight.discard((channel_id, key))
+            if self._wakeup is not None:
+                self._wakeup.set()
@@ -0,0 +1,122 @@
+# history_cli.py
+"""Exporta e importa o histórico de sessões pela linha de comando.
+
+Usa o mesmo banco do bot (SESSION_BACKEND_URL ou SESSION_DB_PATH, também
+lidos do .env) e pode rodar com o bot ligado: cada lote é uma transação
+curta. Não registra batimento nem aparece como processo do bot.
+
+Uso:
+    python history_cli.py export --format csv --guild 123 --since 2026-01-01 -o historico.csv
+    python history_cli.py export --format jsonl --split-bytes 8000000 -o historico.jsonl
+    python history_cli.py import historico.csv --guild 456
+"""
+import argparse
+import os
+import shutil
+import sys
+
+from dotenv import load_dotenv
+
+from history_io import FORMATS, ChunkedExport, day_range, format_from_name, read_history, write_history
+from session_store import open_backend
+
+STATS_UTC_OFFSET_HOURS = -3  # o mesmo fuso do bot.py para os dias de --since/--until
+BATCH_SIZE = 1000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Exportação e importação do histórico de sessões")
+    parser.add_argument("--db", help="URL do backend (padrão: SESSION_BACKEND_URL ou sqlite:///SESSION_DB_PATH)")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="linhas por lote/transação")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="escreve o histórico em CSV ou JSON Lines")
+    export.add_argument("--format", choices=FORMATS, help="padrão: pela extensão de -o, senão csv")
+    export.add_argument("--guild", type=int, help="só este servidor")
+    export.add_argument("--member", type=int, help="só este membro")
+    export.add_argument("--since", help="sessões encerradas a partir deste dia (AAAA-MM-DD)")
+    export.add_argument("--until", help="sessões encerradas até este dia, inclusive (AAAA-MM-DD)")
+    export.add_argument("-o", "--output", help="arquivo de saída (padrão: stdout)")
+    export.add_argument("--split-bytes", type=int,
+                        help="divide em partes de até N bytes (arquivo-001.csv, ...); exige -o")
+
+    imp = commands.add_parser("import", help="carrega um arquivo exportado (linhas repetidas são puladas)")
+    imp.add_argument("file", help="arquivo .csv ou .jsonl ('-' para stdin, com --format)")
+    imp.add_argument("--format", choices=FORMATS, help="padrão: pela extensão do arquivo")
+    imp.add_argument("--guild", type=int, help="grava tudo neste servidor (ex.: ao juntar servidores)")
+    args = parser.parse_args(argv)
+
+    if args.batch < 1:
+        parser.error("--batch precisa ser positivo")
+    if args.command == "export" and args.split_bytes is not None:
+        if not args.output:
+            parser.error("--split-bytes exige -o")
+        if args.split_bytes < 1024:
+            parser.error("--split-bytes precisa ser de pelo menos 1024")
+    if args.command == "import" and args.file == "-" and not args.format:
+        parser.error("para ler do stdin, informe --format")
+    return args
+
+
+def backend_url(args) -> str:
+    return args.db or os.getenv("SESSION_BACKEND_URL") or f"sqlite:///{os.getenv('SESSION_DB_PATH', 'pomoallos.db')}"
+
+
+def run_export(store, args) -> int:
+    fmt = args.format or (format_from_name(args.output, "csv") if args.output else "csv")
+    since, until = day_range(args.since, args.until, STATS_UTC_OFFSET_HOURS)
+    batches = store.iter_history(guild_id=args.guild, member_id=args.member, since=since, until=until,
+                                 batch_size=args.batch)
+    if args.split_bytes is not None:
+        basename = os.path.splitext(args.output)[0]
+        export = ChunkedExport(batches, fmt, args.split_bytes, basename)
+        while True:
+            part = export.next_part()
+            if part is None:
+                break
+            fp, filename, _ = part
+            with fp, open(filename, "wb") as out:
+                shutil.copyfileobj(fp, out)
+            print(filename, file=sys.stderr)
+        print(f"{export.rows} sessões em {export.parts} parte(s)", file=sys.stderr)
+        return 0
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as out:
+            rows = write_history(out, batches, fmt)
+    else:
+        sys.stdout.reconfigure(newline="")
+        rows = write_history(sys.stdout, batches, fmt)
+    print(f"{rows} sessões exportadas", file=sys.stderr)
+    return 0
+
+
+def run_import(store, args) -> int:
+    fmt = args.format or format_from_name(args.file)
+    fp = sys.stdin if args.file == "-" else open(args.file, encoding="utf-8-sig", newline="")
+    try:
+        imported, skipped = store.import_history(read_history(fp, fmt, guild_id=args.guild),
+                                                 batch_size=args.batch)
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+    print(f"{imported} sessões importadas, {skipped} já existiam", file=sys.stderr)
+    return 0
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    args = parse_args(argv)
+    store = open_backend(backend_url(args), utc_offset_hours=STATS_UTC_OFFSET_HOURS, owner_id="history-cli")
+    store.open()
+    try:
+        return (run_export if args.command == "export" else run_import)(store, args)
+    except ValueError as e:
+        # lotes anteriores ao erro já foram gravados; importar de novo pula o que já existe
+        print(f"erro: {e}", file=sys.stderr)
+        return 1
+    finally:
+        store.close(flush=False)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
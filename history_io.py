@@ -0,0 +1,181 @@
+# history_io.py
+"""Exportação e importação do histórico de sessões, em CSV ou JSON Lines.
+
+A exportação lê o histórico em lotes (`SessionBackend.iter_history`) e
+escreve linha a linha, direto na saída ou em partes de tamanho limitado
+(arquivos temporários, um por vez): a memória usada não depende do tamanho
+do histórico. A importação também lê linha a linha, valida cada registro e
+entrega um iterador a `SessionBackend.import_history`, que grava em lotes.
+
+As colunas são as de session_history (`HISTORY_COLUMNS`), com os horários
+em epoch (segundos), para que exportar e importar de volta seja exato.
+"""
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+from typing import IO, Iterable, Iterator, List, Optional, Tuple
+
+from session_store import HISTORY_COLUMNS
+
+FORMATS = ("csv", "jsonl")
+MODES = ("pomodoro", "stopwatch")
+EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+
+def format_from_name(filename: str, default: Optional[str] = None) -> str:
+    """Formato pela extensão do arquivo (.csv, .jsonl/.ndjson)."""
+    fmt = EXTENSIONS.get(os.path.splitext(filename)[1].lower(), default)
+    if fmt is None:
+        raise ValueError(f"não sei o formato de {filename!r} (use .csv ou .jsonl)")
+    return fmt
+
+
+def parse_day(text: str, utc_offset_hours: float = 0) -> float:
+    """Início do dia AAAA-MM-DD no fuso dado, em epoch."""
+    try:
+        day = datetime.date.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"data inválida: {text!r} (use AAAA-MM-DD)") from None
+    tz = datetime.timezone(datetime.timedelta(hours=utc_offset_hours))
+    return datetime.datetime(day.year, day.month, day.day, tzinfo=tz).timestamp()
+
+
+def day_range(since: Optional[str], until: Optional[str],
+              utc_offset_hours: float = 0) -> Tuple[Optional[float], Optional[float]]:
+    """[desde, até] em dias inteiros (ambos inclusivos) para o intervalo [since, until) em epoch."""
+    start = parse_day(since, utc_offset_hours) if since else None
+    end = parse_day(until, utc_offset_hours) + 86400 if until else None
+    if start is not None and end is not None and end <= start:
+        raise ValueError("a data final vem antes da inicial")
+    return start, end
+
+
+# --- escrita ---
+def _header(fmt: str) -> str:
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.writer(out).writerow(HISTORY_COLUMNS)
+        return out.getvalue()
+    return ""
+
+
+def format_row(row: tuple, fmt: str) -> str:
+    """Uma linha do histórico já formatada, com a quebra de linha."""
+    if fmt == "csv":
+        out = io.StringIO()
+        csv.writer(out).writerow(row)
+        return out.getvalue()
+    return json.dumps(dict(zip(HISTORY_COLUMNS, row)), separators=(",", ":")) + "\n"
+
+
+def write_history(out: IO[str], batches: Iterable[List[tuple]], fmt: str) -> int:
+    """Escreve todos os lotes em `out` (aberto com newline=""); devolve o número de linhas."""
+    out.write(_header(fmt))
+    rows = 0
+    for batch in batches:
+        out.write("".join(format_row(row, fmt) for row in batch))
+        rows += len(batch)
+    return rows
+
+
+class ChunkedExport:
+    """Divide a exportação em partes de até `max_bytes`, uma de cada vez.
+
+    `next_part()` escreve a próxima parte num arquivo temporário (binário,
+    já no início) e devolve (arquivo, nome, linhas), ou None no fim. Cada
+    parte CSV repete o cabeçalho, então abre sozinha numa planilha. É
+    síncrono: no bot, roda em asyncio.to_thread, uma parte por chamada.
+    """
+
+    def __init__(self, batches: Iterable[List[tuple]], fmt: str, max_bytes: int, basename: str):
+        self.fmt = fmt
+        self.max_bytes = max_bytes
+        self.basename = basename
+        self.parts = 0
+        self.rows = 0
+        self._rows = (row for batch in batches for row in batch)
+        self._carry: Optional[bytes] = None  # linha que não coube na parte anterior
+        self._header = _header(fmt).encode()
+
+    def next_part(self) -> Optional[Tuple[IO[bytes], str, int]]:
+        line = self._carry if self._carry is not None else self._next_line()
+        if line is None:
+            return None
+        fp = tempfile.TemporaryFile()
+        size = fp.write(self._header)
+        count = 0
+        while line is not None:
+            # uma linha sempre entra numa parte vazia, mesmo que passe do limite
+            if count and size + len(line) > self.max_bytes:
+                break
+            size += fp.write(line)
+            count += 1
+            line = self._next_line()
+        self._carry = line
+        self.parts += 1
+        self.rows += count
+        fp.seek(0)
+        return fp, f"{self.basename}-{self.parts:03d}.{self.fmt}", count
+
+    def _next_line(self) -> Optional[bytes]:
+        row = next(self._rows, None)
+        return None if row is None else format_row(row, self.fmt).encode()
+
+
+# --- leitura ---
+def parse_record(record: dict) -> tuple:
+    """Valida um registro (dict com as colunas do histórico) e devolve a linha pronta para gravar."""
+    missing = [c for c in HISTORY_COLUMNS if record.get(c) in (None, "")]
+    if missing:
+        raise ValueError(f"faltam colunas: {', '.join(missing)}")
+    try:
+        guild_id, member_id = int(record["guild_id"]), int(record["member_id"])
+        started_at, ended_at = float(record["started_at"]), float(record["ended_at"])
+        focused_seconds = int(float(record["focused_seconds"]))
+    except (TypeError, ValueError):
+        raise ValueError("valor numérico inválido") from None
+    mode = str(record["mode"])
+    if mode not in MODES:
+        raise ValueError(f"modo desconhecido: {mode!r}")
+    if ended_at < started_at or focused_seconds < 0:
+        raise ValueError("horários ou tempo focado inconsistentes")
+    return guild_id, member_id, mode, started_at, ended_at, focused_seconds
+
+
+def read_history(fp: IO[str], fmt: str, guild_id: Optional[int] = None) -> Iterator[tuple]:
+    """Linhas validadas do arquivo, uma por vez; `guild_id` troca o servidor de todas.
+
+    Um registro inválido interrompe com ValueError indicando a linha, antes
+    de o lote em que ele estaria ser gravado.
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(fp)
+        records = ((reader.line_num, record) for record in reader)
+    elif fmt == "jsonl":
+        records = _json_records(fp)
+    else:
+        raise ValueError(f"formato desconhecido: {fmt!r}")
+    for line, record in records:
+        try:
+            row = parse_record(record)
+        except ValueError as e:
+            raise ValueError(f"linha {line}: {e}") from None
+        if guild_id is not None:
+            row = (guild_id, *row[1:])
+        yield row
+
+
+def _json_records(fp: IO[str]) -> Iterator[Tuple[int, dict]]:
+    for line, text in enumerate(fp, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except json.JSONDecodeError:
+            raise ValueError(f"linha {line}: JSON inválido") from None
+        if not isinstance(record, dict):
+            raise ValueError(f"linha {line}: esperado um objeto JSON")
+        yield line, record
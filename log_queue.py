@@ -0,0 +1,31 @@
+# log_queue.py
+"""Logging que não bloqueia o event loop.
+
+Os loggers só colocam o registro numa fila (QueueHandler); um QueueListener
+numa thread à parte formata e escreve no stderr. O nível vem de LOG_LEVEL, e
+mensagens abaixo dele nem chegam a ser formatadas.
+"""
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+
+def setup_logging(level: str = "INFO", discord_level: Optional[str] = None) -> logging.handlers.QueueListener:
+    """Liga a raiz dos loggers a uma fila e devolve o listener já rodando."""
+    records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter(FORMAT))
+    listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
+    # o DEBUG do discord.py (eventos do gateway) é muito verboso: só com nível próprio explícito
+    logging.getLogger("discord").setLevel(discord_level or max(root.level, logging.INFO))
+    listener.start()
+    return listener
@@ -0,0 +1,224 @@
+# metrics.py
+"""Métricas no formato de texto do Prometheus, sem dependências externas.
+
+Contadores, gauges e histogramas simples, um registro e um servidor HTTP
+mínimo (asyncio.start_server) que responde GET /metrics. O que já é contado
+em outro lugar (ex.: os contadores por canal do EditDispatcher, as sessões
+em user_data) é lido só na hora da coleta, por callback, sem custo extra no
+caminho quente.
+"""
+import asyncio
+import bisect
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# segundos; cobre de um tick atrasado de 1ms até uma chamada HTTP de 10s
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+Samples = Callable[[], Iterable[Tuple[LabelValues, float]]]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def render(self, out: List[str]):
+        out.append(f"# HELP {self.name} {self.documentation}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        self._render_samples(out)
+
+    def _render_samples(self, out: List[str]):
+        raise NotImplementedError
+
+
+class _Simple(Metric):
+    """Valor por combinação de labels, atualizado na hora ou lido por `collect`."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 collect: Optional[Samples] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(tuple(str(v) for v in labelvalues), 0)
+
+    def _render_samples(self, out: List[str]):
+        items = self._collect() if self._collect is not None else self._values.items()
+        for labelvalues, value in items:
+            out.append(f"{self.name}{_labels(self.labelnames, labelvalues)} {_number(value)}")
+
+
+class Counter(_Simple):
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1):
+        key = tuple(str(v) for v in labelvalues)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Simple):
+    kind = "gauge"
+
+    def set(self, value: float, *labelvalues):
+        self._values[tuple(str(v) for v in labelvalues)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [contagem por bucket (não cumulativa) + overflow, soma, total]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labelvalues):
+        key = tuple(str(v) for v in labelvalues)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, *labelvalues) -> int:
+        series = self._series.get(tuple(str(v) for v in labelvalues))
+        return series[2] if series else 0
+
+    def _render_samples(self, out: List[str]):
+        for labelvalues, (counts, total, n) in self._series.items():
+            cumulative = 0
+            for bound, c in zip((*self.buckets, math.inf), counts):
+                cumulative += c
+                le = _labels(self.labelnames, labelvalues, (("le", _number(bound)),))
+                out.append(f"{self.name}_bucket{le} {cumulative}")
+            plain = _labels(self.labelnames, labelvalues)
+            out.append(f"{self.name}_sum{plain} {_number(total)}")
+            out.append(f"{self.name}_count{plain} {n}")
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn: Callable[[], Iterable[Metric]]):
+        """Registra uma função que devolve métricas na hora da coleta (ex.: de objetos trocáveis)."""
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        out: List[str] = []
+        for metric in self._metrics:
+            metric.render(out)
+        for fn in self._collectors:
+            for metric in fn():
+                metric.render(out)
+        out.append("")
+        return "\n".join(out)
+
+
+class LoopLagMonitor:
+    """Mede quanto o event loop atrasa para acordar um sleep curto."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.histogram = Histogram("pomoallos_event_loop_lag_seconds",
+                                   "Atraso do event loop para acordar um sleep de intervalo fixo")
+        self.last = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last = max(0.0, loop.time() - start - self.interval)
+            self.histogram.observe(self.last)
+
+
+class MetricsServer:
+    """Servidor HTTP mínimo: GET /metrics devolve o registro no formato do Prometheus."""
+
+    def __init__(self, registry: Registry, host: str = "127.0.0.1", port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout=5)
+            # descarta os cabeçalhos
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+            parts = request.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, content_type, body = "200 OK", CONTENT_TYPE, self.registry.render().encode()
+            else:
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"not found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
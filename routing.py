@@ -0,0 +1,137 @@
+# routing.py
+"""Roteamento declarativo: canal de voz -> perfil de modo.
+
+O arquivo de configuração (JSON) define perfis (Pomodoro/Cronômetro com seus
+tempos, intervalo de atualização e canal de anúncio; Pomodoro individual ou em
+sala compartilhada) e quais canais de voz, de qualquer servidor, usam cada
+perfil. Os IDs de canal do Discord são únicos
+globalmente, então o despacho é uma única consulta num dict.
+
+Exemplo (ver channels.example.json):
+
+    {
+      "profiles": {
+        "pomodoro": {"mode": "pomodoro", "focus_seconds": 1500, "break_seconds": 300,
+                     "update_interval": 10, "announce_channel_id": 1403769071887061165}
+      },
+      "channels": {"1403754766240190534": "pomodoro"}
+    }
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+MODES = ("pomodoro", "stopwatch")
+
+
+@dataclass(frozen=True)
+class ModeProfile:
+    name: str
+    mode: str
+    announce_channel_id: int
+    update_interval: float
+    focus_seconds: int = 25 * 60
+    break_seconds: int = 5 * 60
+    batch_announcements: bool = True  # trocas de fase/fins de sessão agrupados por canal
+    shared_room: bool = False  # Pomodoro: um ciclo único por canal de voz, compartilhado por quem está nele
+    relative_timestamps: bool = False  # contagem feita pelo cliente (<t:...:R>); edita só nas trocas de fase
+
+
+class RoutingError(ValueError):
+    """Configuração de roteamento inválida."""
+
+
+def parse_profile(name: str, raw: dict) -> ModeProfile:
+    if not isinstance(raw, dict):
+        raise RoutingError(f"perfil '{name}' deve ser um objeto")
+    mode = raw.get("mode")
+    if mode not in MODES:
+        raise RoutingError(f"perfil '{name}': mode deve ser um de {MODES}")
+    batch = raw.get("batch_announcements", True)
+    shared_room = raw.get("shared_room", False)
+    timestamps = raw.get("relative_timestamps", False)
+    for key, value in (("batch_announcements", batch), ("shared_room", shared_room),
+                       ("relative_timestamps", timestamps)):
+        if not isinstance(value, bool):
+            raise RoutingError(f"perfil '{name}': {key} deve ser true ou false")
+    if shared_room and mode != "pomodoro":
+        raise RoutingError(f"perfil '{name}': shared_room só vale para o modo pomodoro")
+    try:
+        profile = ModeProfile(
+            name=name,
+            mode=mode,
+            announce_channel_id=int(raw["announce_channel_id"]),
+            update_interval=float(raw.get("update_interval", 10 if mode == "pomodoro" else 1)),
+            focus_seconds=int(raw.get("focus_seconds", 25 * 60)),
+            break_seconds=int(raw.get("break_seconds", 5 * 60)),
+            batch_announcements=batch,
+            shared_room=shared_room,
+            relative_timestamps=timestamps,
+        )
+    except KeyError as e:
+        raise RoutingError(f"perfil '{name}': campo obrigatório ausente {e}") from None
+    except (TypeError, ValueError) as e:
+        raise RoutingError(f"perfil '{name}': {e}") from None
+    if profile.update_interval <= 0 or profile.focus_seconds <= 0 or profile.break_seconds <= 0:
+        raise RoutingError(f"perfil '{name}': tempos e intervalos devem ser positivos")
+    return profile
+
+
+class RoutingTable:
+    """Mapa imutável voice_channel_id -> ModeProfile, carregado de um arquivo."""
+
+    def __init__(self, routes: Dict[int, ModeProfile], profiles: Dict[str, ModeProfile],
+                 path: Optional[str] = None, mtime: Optional[float] = None):
+        self.routes = routes
+        self.profiles = profiles
+        self.path = path
+        self.mtime = mtime
+        self.seen_mtime = mtime  # última versão do arquivo já considerada (válida ou não)
+
+    def get(self, voice_channel_id: Optional[int]) -> Optional[ModeProfile]:
+        return self.routes.get(voice_channel_id)
+
+    def __len__(self) -> int:
+        return len(self.routes)
+
+    @classmethod
+    def from_dict(cls, raw: dict, path: Optional[str] = None, mtime: Optional[float] = None) -> "RoutingTable":
+        if not isinstance(raw, dict):
+            raise RoutingError("a configuração deve ser um objeto JSON")
+        profiles = {name: parse_profile(name, p) for name, p in (raw.get("profiles") or {}).items()}
+        routes = {}
+        for channel_id, profile_name in (raw.get("channels") or {}).items():
+            if profile_name not in profiles:
+                raise RoutingError(f"canal {channel_id}: perfil desconhecido '{profile_name}'")
+            try:
+                routes[int(channel_id)] = profiles[profile_name]
+            except ValueError:
+                raise RoutingError(f"ID de canal inválido: {channel_id!r}") from None
+        return cls(routes, profiles, path, mtime)
+
+    @classmethod
+    def load(cls, path: str) -> "RoutingTable":
+        mtime = os.stat(path).st_mtime
+        try:
+            with open(path, encoding="utf-8") as f:
+                raw = json.load(f)
+        except json.JSONDecodeError as e:
+            raise RoutingError(f"{path}: JSON inválido ({e})") from None
+        return cls.from_dict(raw, path, mtime)
+
+    def changed_on_disk(self) -> bool:
+        """True se o arquivo de origem foi criado/alterado desde a última checagem."""
+        if self.path is None:
+            return False
+        try:
+            return os.stat(self.path).st_mtime != self.seen_mtime
+        except FileNotFoundError:
+            return False
+
+    def mark_seen(self):
+        """Ignora a versão atual do arquivo (ex.: era inválida) até ele mudar de novo."""
+        try:
+            self.seen_mtime = os.stat(self.path).st_mtime
+        except (FileNotFoundError, TypeError):
+            pass
@@ -0,0 +1,189 @@
+# scheduler.py
+"""Agendador central de deadlines para as sessões do PomoAllos.
+
+Em vez de uma asyncio.Task por membro dormindo com asyncio.sleep, todas as
+sessões registram o próximo deadline (no relógio monotônico do event loop)
+numa única heap. Uma task "driver" acorda no deadline mais próximo, retira
+todos os itens vencidos de uma vez e dispara seus callbacks em lote.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+from metrics import Histogram
+
+log = logging.getLogger("pomoallos.scheduler")
+
+# callback(key, lateness) -> coroutine; lateness = segundos de atraso em relação ao deadline
+TickCallback = Callable[[Hashable, float], Awaitable[None]]
+
+# Itens que vencem dentro desta janela são disparados no mesmo lote
+DEFAULT_BATCH_WINDOW = 0.05
+
+
+class _Entry:
+    __slots__ = ("deadline", "seq", "key", "callback", "alive")
+
+    def __init__(self, deadline: float, seq: int, key: Hashable, callback: TickCallback):
+        self.deadline = deadline
+        self.seq = seq
+        self.key = key
+        self.callback = callback
+        self.alive = True
+
+    def __lt__(self, other: "_Entry") -> bool:
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class TickScheduler:
+    """Heap de deadlines com um único driver no event loop.
+
+    Cada chave (ex.: member.id) tem no máximo um deadline pendente; agendar de
+    novo substitui o anterior. Cancelar é O(1) (remoção preguiçosa) e a heap é
+    compactada quando as entradas mortas passam da metade.
+    """
+
+    def __init__(self, batch_window: float = DEFAULT_BATCH_WINDOW):
+        self.batch_window = batch_window
+        self._heap: List[_Entry] = []
+        self._entries: Dict[Hashable, _Entry] = {}
+        self._seq = itertools.count()
+        self._dead = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._driver: Optional[asyncio.Task] = None
+        self._batches: set = set()
+        # estatísticas simples para o !debug
+        self.fired = 0
+        self.batches = 0
+        self.max_lateness = 0.0
+        self.lateness = Histogram("pomoallos_scheduler_lateness_seconds",
+                                  "Atraso de cada deadline disparado em relação ao agendado")
+
+    # --- relógio ---
+    @staticmethod
+    def now() -> float:
+        return asyncio.get_running_loop().time()
+
+    # --- ciclo de vida ---
+    def start(self):
+        if self._driver is None or self._driver.done():
+            self._wakeup = asyncio.Event()
+            self._driver = asyncio.create_task(self._run(), name="tick-scheduler")
+
+    async def stop(self):
+        if self._driver is not None:
+            self._driver.cancel()
+            try:
+                await self._driver
+            except asyncio.CancelledError:
+                pass
+            self._driver = None
+        for task in list(self._batches):
+            task.cancel()
+
+    # --- API ---
+    def schedule(self, key: Hashable, deadline: float, callback: TickCallback):
+        """Agenda (ou reagenda) `key` para disparar em `deadline` (loop.time())."""
+        old = self._entries.get(key)
+        if old is not None:
+            old.alive = False
+            self._dead += 1
+        entry = _Entry(deadline, next(self._seq), key, callback)
+        self._entries[key] = entry
+        was_first = not self._heap or entry < self._heap[0]
+        heapq.heappush(self._heap, entry)
+        self._maybe_compact()
+        if was_first and self._wakeup is not None:
+            self._wakeup.set()
+
+    def schedule_in(self, key: Hashable, delay: float, callback: TickCallback):
+        self.schedule(key, self.now() + max(0.0, delay), callback)
+
+    def cancel(self, key: Hashable) -> bool:
+        """Remove o deadline pendente de `key`. Não há task para derrubar."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry.alive = False
+        self._dead += 1
+        self._maybe_compact()
+        return True
+
+    def deadline_of(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        return entry.deadline if entry else None
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- internos ---
+    def _maybe_compact(self):
+        if self._dead > 64 and self._dead * 2 > len(self._heap):
+            self._heap = [e for e in self._heap if e.alive]
+            heapq.heapify(self._heap)
+            self._dead = 0
+
+    def _pop_dead(self):
+        while self._heap and not self._heap[0].alive:
+            heapq.heappop(self._heap)
+            self._dead -= 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._pop_dead()
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0].deadline - loop.time()
+            if delay > 0:
+                # asyncio.timeout, não wait_for: no 3.11 o wait_for engole o
+                # cancelamento do stop() se o evento disparar no mesmo instante
+                try:
+                    async with asyncio.timeout(delay):
+                        await self._wakeup.wait()
+                    continue  # algo mais cedo foi agendado; recalcula
+                except TimeoutError:
+                    pass
+
+            now = loop.time()
+            limit = now + self.batch_window
+            batch = []
+            while self._heap and self._heap[0].deadline <= limit:
+                entry = heapq.heappop(self._heap)
+                if not entry.alive:
+                    self._dead -= 1
+                    continue
+                del self._entries[entry.key]
+                batch.append(entry)
+            if batch:
+                self._dispatch(batch, now)
+
+    def _dispatch(self, batch: List[_Entry], now: float):
+        self.batches += 1
+        self.fired += len(batch)
+        calls = []
+        for entry in batch:
+            lateness = max(0.0, now - entry.deadline)
+            if lateness > self.max_lateness:
+                self.max_lateness = lateness
+            self.lateness.observe(lateness)
+            calls.append(entry.callback(entry.key, lateness))
+        # um único task por lote, não por sessão
+        task = asyncio.create_task(self._fire(calls))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    @staticmethod
+    async def _fire(calls):
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, asyncio.CancelledError):
+                log.error("Erro em callback do agendador", exc_info=result)
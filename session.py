@@ -0,0 +1,127 @@
+# session.py
+"""Registro compacto de uma sessão ativa (e de uma sala compartilhada).
+
+Guarda só IDs e números: nada de discord.Member, TextChannel ou Message. Os
+objetos do discord.py são obtidos do cache do cliente (ou montados como
+PartialMessage) apenas no momento em que uma mensagem sai, então uma sessão
+longa não mantém vivo o estado de membros/canais que já foram removidos.
+
+Numa sala compartilhada o ciclo é do canal de voz (`Room`), não do membro:
+a sessão de cada membro guarda só quando ele entrou, e o foco creditado é
+a parte das fases de foco da sala que caiu entre a entrada e a saída.
+"""
+from typing import Dict, Optional
+
+from routing import ModeProfile
+
+
+class Session:
+    __slots__ = (
+        "member_id", "guild_id", "mode", "profile",
+        "voice_channel_id", "announce_channel_id", "message_id",
+        "start_time",       # epoch (s) do início da sessão
+        "phase_start",      # relógio monotônico do loop
+        "phase_end",        # idem; None no cronômetro
+        "cycle_phase",      # "focus" / "break"; None no cronômetro
+        "focused_seconds",
+        "elapsed_seconds",
+        "render",           # cache de renderização (ver render_progress no bot.py)
+        "room",             # Room da sala compartilhada; None no ciclo individual
+    )
+
+    def __init__(self, member_id: int, guild_id: int, profile: ModeProfile, voice_channel_id: int,
+                 announce_channel_id: int, start_time: float, phase_start: float,
+                 mode: Optional[str] = None):
+        self.member_id = member_id
+        self.guild_id = guild_id
+        self.mode = mode or profile.mode
+        self.profile = profile
+        self.voice_channel_id = voice_channel_id
+        self.announce_channel_id = announce_channel_id
+        self.message_id: Optional[int] = None
+        self.start_time = start_time
+        self.phase_start = phase_start
+        self.phase_end: Optional[float] = None
+        self.cycle_phase: Optional[str] = None
+        self.focused_seconds = 0
+        self.elapsed_seconds = 0
+        self.render = None
+        self.room: Optional["Room"] = None
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.member_id}>"
+
+    def __repr__(self) -> str:
+        return (f"<Session member={self.member_id} mode={self.mode} "
+                f"voice={self.voice_channel_id} phase={self.cycle_phase}>")
+
+
+ROOM_MENTION_LIMIT = 50  # menções por anúncio da sala (o conteúdo da mensagem tem limite de 2000 caracteres)
+
+
+class Room:
+    """Ciclo Pomodoro único de um canal de voz, compartilhado por todos nele.
+
+    A linha do tempo é fixa a partir de `origin` (relógio monotônico do loop):
+    foco, pausa, foco... com os tempos do perfil. A fase atual é calculada,
+    não acumulada, então um tick atrasado não desloca o ciclo.
+    """
+
+    __slots__ = (
+        "voice_channel_id", "guild_id", "profile", "announce_channel_id", "message_id",
+        "origin", "phase_start", "phase_end", "cycle_phase",
+        "members",          # member_id -> Session, na ordem de entrada
+        "render",           # cache de renderização da mensagem da sala
+    )
+
+    def __init__(self, voice_channel_id: int, guild_id: int, profile: ModeProfile,
+                 announce_channel_id: int, origin: float):
+        self.voice_channel_id = voice_channel_id
+        self.guild_id = guild_id
+        self.profile = profile
+        self.announce_channel_id = announce_channel_id
+        self.message_id: Optional[int] = None
+        self.origin = origin
+        self.phase_start = origin
+        self.phase_end = origin + profile.focus_seconds
+        self.cycle_phase = "focus"
+        self.members: Dict[int, Session] = {}
+        self.render = None
+
+    @property
+    def mention(self) -> str:
+        """Menções dos membros (os primeiros ROOM_MENTION_LIMIT), para os anúncios da sala"""
+        mentions = []
+        for data in self.members.values():
+            if len(mentions) >= ROOM_MENTION_LIMIT:
+                break
+            mentions.append(data.mention)
+        return " ".join(mentions)
+
+    def advance(self, now: float) -> bool:
+        """Leva a fase atual até `now`; True se a fase mudou."""
+        focus, period = self.profile.focus_seconds, self.profile.focus_seconds + self.profile.break_seconds
+        cycles, offset = divmod(max(0.0, now - self.origin), period)
+        cycle_start = self.origin + cycles * period
+        if offset < focus:
+            phase, start, end = "focus", cycle_start, cycle_start + focus
+        else:
+            phase, start, end = "break", cycle_start + focus, cycle_start + period
+        changed = start != self.phase_start
+        self.cycle_phase, self.phase_start, self.phase_end = phase, start, end
+        return changed
+
+    def focus_until(self, t: float) -> float:
+        """Segundos de foco da linha do tempo entre `origin` e `t`."""
+        focus, period = self.profile.focus_seconds, self.profile.focus_seconds + self.profile.break_seconds
+        cycles, offset = divmod(max(0.0, t - self.origin), period)
+        return cycles * focus + min(offset, focus)
+
+    def focused_between(self, start: float, end: float) -> int:
+        """Foco creditado a quem esteve na sala de `start` a `end`."""
+        return max(0, int(self.focus_until(end) - self.focus_until(start)))
+
+    def __repr__(self) -> str:
+        return (f"<Room voice={self.voice_channel_id} members={len(self.members)} "
+                f"phase={self.cycle_phase}>")
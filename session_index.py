@@ -0,0 +1,84 @@
+# session_index.py
+"""Índice das sessões ativas por servidor, modo e canal de voz.
+
+Cada combinação (servidor, modo, canal) — com modo e/ou canal em aberto —
+tem uma lista ordenada por início da sessão. Contar quantas passam de um
+tempo mínimo é uma busca binária, e uma página é um fatiamento: o custo
+depende do tamanho da página, não do número de sessões ativas.
+"""
+import bisect
+import collections
+import math
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from session import Session
+
+Entry = Tuple[float, int]  # (start_time, member_id)
+
+
+class SessionIndex:
+    def __init__(self):
+        self._buckets: Dict[Hashable, List[Entry]] = {}
+        self._entries: Dict[int, Tuple[Entry, Tuple[Hashable, ...]]] = {}
+        self._modes: collections.Counter = collections.Counter()  # sessões por modo, todos os servidores
+
+    @staticmethod
+    def _keys(guild_id: int, mode: str, channel_id: int) -> Tuple[Hashable, ...]:
+        return (
+            (guild_id, None, None),
+            (guild_id, mode, None),
+            (guild_id, None, channel_id),
+            (guild_id, mode, channel_id),
+        )
+
+    def add(self, data: Session):
+        self.remove(data.member_id)
+        entry = (data.start_time, data.member_id)
+        keys = self._keys(data.guild_id, data.mode, data.voice_channel_id)
+        for key in keys:
+            bisect.insort(self._buckets.setdefault(key, []), entry)
+        self._entries[data.member_id] = (entry, keys)
+        self._modes[data.mode] += 1
+
+    def remove(self, member_id: int) -> bool:
+        found = self._entries.pop(member_id, None)
+        if found is None:
+            return False
+        entry, keys = found
+        mode = keys[1][1]
+        self._modes[mode] -= 1
+        if not self._modes[mode]:
+            del self._modes[mode]
+        for key in keys:
+            bucket = self._buckets[key]
+            i = bisect.bisect_left(bucket, entry)
+            if i < len(bucket) and bucket[i] == entry:
+                del bucket[i]
+            if not bucket:
+                del self._buckets[key]
+        return True
+
+    def count(self, guild_id: int, mode: Optional[str] = None, channel_id: Optional[int] = None,
+              started_before: Optional[float] = None) -> int:
+        """Sessões do servidor que passam nos filtros (iniciadas até `started_before`, epoch)."""
+        bucket = self._buckets.get((guild_id, mode, channel_id), ())
+        if started_before is None:
+            return len(bucket)
+        return bisect.bisect_right(bucket, (started_before, math.inf))
+
+    def page(self, guild_id: int, offset: int, limit: int, mode: Optional[str] = None,
+             channel_id: Optional[int] = None, started_before: Optional[float] = None) -> List[int]:
+        """member_ids de uma página, das sessões mais antigas para as mais novas."""
+        bucket = self._buckets.get((guild_id, mode, channel_id), ())
+        end = min(offset + limit, self.count(guild_id, mode, channel_id, started_before))
+        return [member_id for _, member_id in bucket[offset:end]]
+
+    def mode_counts(self) -> Dict[str, int]:
+        """Sessões por modo em todos os servidores deste processo."""
+        return dict(self._modes)
+
+    def __contains__(self, member_id: int) -> bool:
+        return member_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,585 @@
+# session_store.py
+"""Armazenamento durável das sessões em SQLite (modo WAL).
+
+As mudanças de estado ficam num buffer em memória (a última versão de cada
+sessão vence) e são gravadas em lote, numa única transação, a cada flush.
+Na inicialização o bot lê as sessões gravadas para reconstruir o que estava
+rodando antes de reiniciar ou cair.
+
+Sessões finalizadas vão para `session_history` e, na mesma transação, somam
+nos agregados diário/semanal/mensal/total de `focus_rollups` (por membro e por
+servidor). `!stats` e `!rank` leem só os agregados, nunca o histórico bruto.
+
+Com vários processos (um por grupo de shards) o mesmo backend é compartilhado:
+cada sessão guarda o processo dono (`owner_id`) e cada processo registra seus
+shards, um batimento e quantas sessões ativas tem por modo em `owners`. Ao iniciar, um processo adota as sessões
+dos servidores dos seus shards, venham de onde vierem; a partir daí as
+gravações atrasadas do dono anterior não sobrescrevem mais essas linhas.
+
+O histórico pode ser lido em lotes (`iter_history`, para exportar) e
+carregado em lotes, uma transação por lote (`import_history`), somando nos
+agregados como uma sessão encerrada normalmente.
+
+`SessionBackend` é a interface que o bot usa; `SessionStore` é a
+implementação em SQLite (serve de backend compartilhado entre processos na
+mesma máquina). Outros backends entram com `register_backend`.
+"""
+import abc
+import asyncio
+import datetime
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    member_id           INTEGER PRIMARY KEY,
+    guild_id            INTEGER NOT NULL,
+    mode                TEXT    NOT NULL,
+    voice_channel_id    INTEGER NOT NULL,
+    announce_channel_id INTEGER NOT NULL,
+    message_id          INTEGER,
+    start_time          REAL    NOT NULL,
+    cycle_phase         TEXT,
+    phase_start         REAL,
+    phase_end           REAL,
+    focused_seconds     INTEGER NOT NULL DEFAULT 0,
+    updated_at          REAL    NOT NULL,
+    owner_id            TEXT,
+    room_origin         REAL   -- início do ciclo da sala compartilhada; NULL = ciclo individual
+);
+CREATE TABLE IF NOT EXISTS owners (
+    owner_id    TEXT PRIMARY KEY,
+    shard_count INTEGER NOT NULL,
+    shard_ids   TEXT    NOT NULL,  -- "0,2,4"; vazio = todos os shards
+    heartbeat   REAL    NOT NULL,
+    sessions    TEXT    NOT NULL DEFAULT ''  -- sessões ativas por modo: "pomodoro=3,stopwatch=1"
+);
+CREATE TABLE IF NOT EXISTS dashboards (
+    channel_id INTEGER PRIMARY KEY,
+    message_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS session_history (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id        INTEGER NOT NULL,
+    member_id       INTEGER NOT NULL,
+    mode            TEXT    NOT NULL,
+    started_at      REAL    NOT NULL,
+    ended_at        REAL    NOT NULL,
+    focused_seconds INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_guild_member ON session_history (guild_id, member_id, ended_at);
+CREATE TABLE IF NOT EXISTS focus_rollups (
+    guild_id        INTEGER NOT NULL,
+    period          TEXT    NOT NULL,  -- day | week | month | all
+    bucket          TEXT    NOT NULL,  -- 2025-08-09 | 2025-W32 | 2025-08 | all
+    member_id       INTEGER NOT NULL,  -- GUILD_TOTAL = soma do servidor
+    focused_seconds INTEGER NOT NULL,
+    sessions        INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, period, bucket, member_id)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_rank ON focus_rollups (guild_id, period, bucket, focused_seconds DESC);
+"""
+
+PERIODS = ("day", "week", "month", "all")
+GUILD_TOTAL = 0  # member_id usado para o agregado do servidor inteiro
+
+HISTORY_COLUMNS = ("guild_id", "member_id", "mode", "started_at", "ended_at", "focused_seconds")
+
+_ROLLUP_UPSERT = """
+INSERT INTO focus_rollups (guild_id, period, bucket, member_id, focused_seconds, sessions)
+VALUES (?, ?, ?, ?, ?, 1)
+ON CONFLICT (guild_id, period, bucket, member_id) DO UPDATE SET
+    focused_seconds = focused_seconds + excluded.focused_seconds,
+    sessions = sessions + 1
+"""
+
+SESSION_COLUMNS = (
+    "member_id", "guild_id", "mode", "voice_channel_id", "announce_channel_id", "message_id",
+    "start_time", "cycle_phase", "phase_start", "phase_end", "focused_seconds", "updated_at", "room_origin",
+)
+
+# Só sobrescreve a linha do próprio dono. Uma sessão de outro servidor (o
+# membro trocou de servidor e o outro processo ainda não apagou a antiga) é
+# substituída; a de um servidor adotado por outro processo, não.
+_UPSERT = (
+    f"INSERT INTO sessions ({', '.join(SESSION_COLUMNS)}, owner_id) "
+    f"VALUES ({', '.join('?' for _ in SESSION_COLUMNS)}, ?) "
+    f"ON CONFLICT (member_id) DO UPDATE SET "
+    + ", ".join(f"{c} = excluded.{c}" for c in SESSION_COLUMNS[1:])
+    + ", owner_id = excluded.owner_id "
+    "WHERE sessions.owner_id IS NULL OR sessions.owner_id = excluded.owner_id "
+    "OR sessions.guild_id != excluded.guild_id"
+)
+
+OWNER_RETENTION = 7 * 24 * 3600  # donos sem sessões e sem batimento há mais que isso são apagados
+
+
+def shard_of(guild_id: int, shard_count: int) -> int:
+    """Shard que recebe os eventos do servidor (fórmula do Discord)."""
+    return (guild_id >> 22) % shard_count if shard_count > 1 else 0
+
+
+def _shard_filter(shard_count: int, shard_ids: Optional[Sequence[int]], column: str = "guild_id"):
+    """Cláusula SQL (e parâmetros) que seleciona os servidores dos shards dados."""
+    if shard_count <= 1 or shard_ids is None:
+        return "1", ()
+    ids = sorted(set(shard_ids))
+    return f"(({column} >> 22) % ?) IN ({', '.join('?' for _ in ids)})", (shard_count, *ids)
+
+
+def period_buckets(ts: float, utc_offset_hours: float = 0) -> Dict[str, str]:
+    """Chaves dos agregados (dia/semana ISO/mês/total) que contêm o instante `ts`."""
+    tz = datetime.timezone(datetime.timedelta(hours=utc_offset_hours))
+    d = datetime.datetime.fromtimestamp(ts, tz).date()
+    year, week, _ = d.isocalendar()
+    return {
+        "day": d.isoformat(),
+        "week": f"{year}-W{week:02d}",
+        "month": f"{d.year}-{d.month:02d}",
+        "all": "all",
+    }
+
+
+class SessionBackend(abc.ABC):
+    """O que o bot precisa do armazenamento de sessões.
+
+    Escritas (`put`, `delete`, `put_dashboard`, `record_session`) só enchem um
+    buffer; `flush` as grava. As leituras são síncronas e chamadas numa thread
+    (asyncio.to_thread).
+    """
+
+    owner_id: str
+
+    @abc.abstractmethod
+    def open(self): ...
+
+    @abc.abstractmethod
+    def close(self, flush: bool = True): ...
+
+    @abc.abstractmethod
+    def set_shards(self, shard_count: int, shard_ids: Optional[Sequence[int]]): ...
+
+    @abc.abstractmethod
+    def set_session_counts(self, counts: Dict[str, int]): ...
+
+    @abc.abstractmethod
+    def put(self, record: dict): ...
+
+    @abc.abstractmethod
+    def delete(self, member_id: int): ...
+
+    @abc.abstractmethod
+    def put_dashboard(self, channel_id: int, message_id: Optional[int]): ...
+
+    @abc.abstractmethod
+    def record_session(self, guild_id: int, member_id: int, mode: str, started_at: float,
+                       ended_at: float, focused_seconds: int): ...
+
+    @abc.abstractmethod
+    async def flush(self): ...
+
+    @abc.abstractmethod
+    def adopt_sessions(self, shard_count: int = 1, shard_ids: Optional[Sequence[int]] = None) -> List[dict]: ...
+
+    @abc.abstractmethod
+    def load_dashboards(self) -> Dict[int, int]: ...
+
+    @abc.abstractmethod
+    def heartbeat(self) -> Optional[float]: ...
+
+    @abc.abstractmethod
+    def cluster_summary(self, alive_since: float) -> Dict[str, dict]: ...
+
+    @abc.abstractmethod
+    def member_stats(self, guild_id: int, member_id: int, now: Optional[float] = None) -> Dict[str, Tuple[int, int]]: ...
+
+    @abc.abstractmethod
+    def leaderboard(self, guild_id: int, period: str, limit: int = 10,
+                    now: Optional[float] = None) -> List[Tuple[int, int, int]]: ...
+
+    @abc.abstractmethod
+    def member_rank(self, guild_id: int, member_id: int, period: str,
+                    now: Optional[float] = None) -> Optional[Tuple[int, int]]: ...
+
+    @abc.abstractmethod
+    def iter_history(self, guild_id: Optional[int] = None, member_id: Optional[int] = None,
+                     since: Optional[float] = None, until: Optional[float] = None,
+                     batch_size: int = 1000) -> Iterator[List[tuple]]: ...
+
+    @abc.abstractmethod
+    def import_history(self, rows: Iterable[tuple], batch_size: int = 1000) -> Tuple[int, int]: ...
+
+
+class SessionStore(SessionBackend):
+    """Buffer write-behind sobre um arquivo SQLite.
+
+    `put`/`delete` só mexem no buffer (O(1), sem I/O no event loop); `flush`
+    grava tudo de uma vez numa thread. Os horários são epoch (time.time()).
+    """
+
+    def __init__(self, path: str, utc_offset_hours: float = 0, owner_id: str = "local"):
+        self.path = path
+        self.utc_offset_hours = utc_offset_hours
+        self.owner_id = owner_id
+        self.shard_count = 1
+        self.shard_ids: Optional[Tuple[int, ...]] = None  # None = todos
+        self.session_counts: Dict[str, int] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._io_lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # member_id -> registro (dict) ou None para apagar
+        self._pending: Dict[int, Optional[dict]] = {}
+        self._pending_dashboards: Dict[int, Optional[int]] = {}
+        self._pending_history: List[tuple] = []
+        self.flushes = 0
+        self.rows_written = 0
+
+    # --- conexão ---
+    def open(self):
+        if self._conn is not None:
+            return
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")  # outros processos podem estar gravando
+        conn.executescript(SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        if "owner_id" not in columns:  # banco criado antes do modo com vários processos
+            conn.execute("ALTER TABLE sessions ADD COLUMN owner_id TEXT")
+        if "room_origin" not in columns:  # banco criado antes das salas compartilhadas
+            conn.execute("ALTER TABLE sessions ADD COLUMN room_origin REAL")
+        if "sessions" not in {row[1] for row in conn.execute("PRAGMA table_info(owners)")}:
+            # banco criado antes de o !status ler as contagens de `owners`
+            conn.execute("ALTER TABLE owners ADD COLUMN sessions TEXT NOT NULL DEFAULT ''")
+        # depois das migrações: bancos antigos ainda não tinham owner_id
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_owner ON sessions (owner_id, mode)")
+        conn.execute(
+            "DELETE FROM owners WHERE heartbeat < ? AND owner_id NOT IN "
+            "(SELECT owner_id FROM sessions WHERE owner_id IS NOT NULL)",
+            (time.time() - OWNER_RETENTION,),
+        )
+        self._conn = conn
+
+    def set_shards(self, shard_count: int, shard_ids: Optional[Sequence[int]]):
+        """Shards deste processo (registrados em `owners` a cada flush)."""
+        self.shard_count = max(1, shard_count)
+        self.shard_ids = tuple(sorted(shard_ids)) if shard_ids is not None else None
+
+    def set_session_counts(self, counts: Dict[str, int]):
+        """Sessões ativas deste processo por modo (registradas em `owners` a cada flush)."""
+        self.session_counts = dict(counts)
+
+    def close(self, flush: bool = True):
+        """Grava o que estiver pendente e fecha (síncrono; usado no encerramento).
+
+        `flush=False` só fecha: ferramentas de linha de comando não devem
+        registrar batimento nem aparecer como processo do bot.
+        """
+        if self._conn is None:
+            return
+        if flush:
+            self._write(*self._take_pending())
+        self._conn.close()
+        self._conn = None
+
+    # --- buffer ---
+    def put(self, record: dict):
+        self._pending[record["member_id"]] = record
+
+    def delete(self, member_id: int):
+        self._pending[member_id] = None
+
+    def put_dashboard(self, channel_id: int, message_id: Optional[int]):
+        self._pending_dashboards[channel_id] = message_id
+
+    def record_session(self, guild_id: int, member_id: int, mode: str, started_at: float,
+                       ended_at: float, focused_seconds: int):
+        """Guarda uma sessão finalizada; histórico e agregados vão no próximo flush."""
+        self._pending_history.append((guild_id, member_id, mode, started_at, ended_at, int(focused_seconds)))
+
+    def pending_count(self) -> int:
+        return len(self._pending) + len(self._pending_dashboards) + len(self._pending_history)
+
+    def _take_pending(self):
+        sessions, self._pending = self._pending, {}
+        dashboards, self._pending_dashboards = self._pending_dashboards, {}
+        history, self._pending_history = self._pending_history, []
+        return sessions, dashboards, history
+
+    async def flush(self):
+        """Grava o buffer numa única transação, fora do event loop."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            sessions, dashboards, history = self._take_pending()
+            try:
+                await asyncio.to_thread(self._write, sessions, dashboards, history)
+            except Exception:
+                # devolve ao buffer o que não foi substituído por uma versão mais nova
+                for member_id, record in sessions.items():
+                    self._pending.setdefault(member_id, record)
+                for channel_id, message_id in dashboards.items():
+                    self._pending_dashboards.setdefault(channel_id, message_id)
+                self._pending_history[:0] = history
+                raise
+
+    def _rollup_rows(self, history: List[tuple]) -> List[tuple]:
+        rows = []
+        for guild_id, member_id, _mode, _started, ended_at, seconds in history:
+            for period, bucket in period_buckets(ended_at, self.utc_offset_hours).items():
+                rows.append((guild_id, period, bucket, member_id, seconds))
+                rows.append((guild_id, period, bucket, GUILD_TOTAL, seconds))
+        return rows
+
+    def _write(self, sessions: Dict[int, Optional[dict]], dashboards: Dict[int, Optional[int]],
+               history: List[tuple] = ()):
+        owner = self.owner_id
+        upserts = [(*(r[c] for c in SESSION_COLUMNS), owner) for r in sessions.values() if r is not None]
+        deletes = [(mid, owner) for mid, r in sessions.items() if r is None]
+        rollups = self._rollup_rows(history)
+        shard_ids = ",".join(map(str, self.shard_ids)) if self.shard_ids is not None else ""
+        counts = ",".join(f"{mode}={n}" for mode, n in sorted(self.session_counts.items()))
+        with self._io_lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if upserts:
+                    conn.executemany(_UPSERT, upserts)
+                if deletes:
+                    conn.executemany(
+                        "DELETE FROM sessions WHERE member_id = ? AND (owner_id IS NULL OR owner_id = ?)", deletes)
+                for channel_id, message_id in dashboards.items():
+                    if message_id is None:
+                        conn.execute("DELETE FROM dashboards WHERE channel_id = ?", (channel_id,))
+                    else:
+                        conn.execute("INSERT OR REPLACE INTO dashboards VALUES (?, ?)", (channel_id, message_id))
+                if history:
+                    conn.executemany(
+                        f"INSERT INTO session_history ({', '.join(HISTORY_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                        history,
+                    )
+                    conn.executemany(_ROLLUP_UPSERT, rollups)
+                # batimento: até quando sabemos que as sessões (deste dono) estavam vivas
+                now = time.time()
+                conn.execute("INSERT OR REPLACE INTO meta VALUES ('heartbeat', ?)", (now,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO owners (owner_id, shard_count, shard_ids, heartbeat, sessions) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (owner, self.shard_count, shard_ids, now, counts),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self.flushes += 1
+        self.rows_written += len(upserts) + len(deletes) + len(dashboards) + len(history) + len(rollups)
+
+    # --- leitura (inicialização) ---
+    def adopt_sessions(self, shard_count: int = 1, shard_ids: Optional[Sequence[int]] = None) -> List[dict]:
+        """Assume as sessões dos servidores destes shards e as devolve.
+
+        Cada registro traz `owner_heartbeat`: o último batimento do dono
+        anterior, até quando a sessão certamente estava rodando.
+        """
+        where, params = _shard_filter(shard_count, shard_ids, "s.guild_id")
+        columns = ", ".join(f"s.{c}" for c in SESSION_COLUMNS)
+        with self._io_lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    f"SELECT {columns}, o.heartbeat FROM sessions s "
+                    f"LEFT JOIN owners o ON o.owner_id = s.owner_id WHERE {where}",
+                    params,
+                ).fetchall()
+                where_plain, _ = _shard_filter(shard_count, shard_ids)
+                conn.execute(f"UPDATE sessions SET owner_id = ? WHERE {where_plain}", (self.owner_id, *params))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return [dict(zip((*SESSION_COLUMNS, "owner_heartbeat"), row)) for row in rows]
+
+    def load_dashboards(self) -> Dict[int, int]:
+        with self._io_lock:
+            return dict(self._conn.execute("SELECT channel_id, message_id FROM dashboards").fetchall())
+
+    def heartbeat(self) -> Optional[float]:
+        with self._io_lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'heartbeat'").fetchone()
+        return row[0] if row else None
+
+    def cluster_summary(self, alive_since: float) -> Dict[str, dict]:
+        """Processos com batimento desde `alive_since` e suas sessões ativas por modo.
+
+        Lê só `owners`: cada processo grava as próprias contagens no flush,
+        então o custo não depende do número de sessões.
+        """
+        with self._io_lock:
+            rows = self._conn.execute(
+                "SELECT owner_id, shard_count, shard_ids, sessions FROM owners WHERE heartbeat >= ?",
+                (alive_since,),
+            ).fetchall()
+        summary: Dict[str, dict] = {}
+        for owner_id, shard_count, shard_ids, sessions in rows:
+            counts = (item.partition("=") for item in sessions.split(",")) if sessions else ()
+            summary[owner_id] = {
+                "shard_count": shard_count,
+                "shard_ids": [int(x) for x in shard_ids.split(",")] if shard_ids else None,
+                "sessions": {mode: int(n) for mode, _, n in counts},
+            }
+        return summary
+
+    # --- estatísticas (só agregados + índice) ---
+    def member_stats(self, guild_id: int, member_id: int, now: Optional[float] = None) -> Dict[str, Tuple[int, int]]:
+        """(segundos, sessões) do membro no dia/semana/mês atuais e no total."""
+        buckets = period_buckets(now if now is not None else time.time(), self.utc_offset_hours)
+        result = {}
+        with self._io_lock:
+            for period, bucket in buckets.items():
+                row = self._conn.execute(
+                    "SELECT focused_seconds, sessions FROM focus_rollups "
+                    "WHERE guild_id = ? AND period = ? AND bucket = ? AND member_id = ?",
+                    (guild_id, period, bucket, member_id),
+                ).fetchone()
+                result[period] = (row[0], row[1]) if row else (0, 0)
+        return result
+
+    def leaderboard(self, guild_id: int, period: str, limit: int = 10,
+                    now: Optional[float] = None) -> List[Tuple[int, int, int]]:
+        """Top `limit` (member_id, segundos, sessões) do período atual, pelo índice de ranking."""
+        bucket = period_buckets(now if now is not None else time.time(), self.utc_offset_hours)[period]
+        with self._io_lock:
+            return self._conn.execute(
+                "SELECT member_id, focused_seconds, sessions FROM focus_rollups "
+                "WHERE guild_id = ? AND period = ? AND bucket = ? AND member_id != ? "
+                "ORDER BY focused_seconds DESC LIMIT ?",
+                (guild_id, period, bucket, GUILD_TOTAL, limit),
+            ).fetchall()
+
+    def member_rank(self, guild_id: int, member_id: int, period: str,
+                    now: Optional[float] = None) -> Optional[Tuple[int, int]]:
+        """(posição, segundos) do membro no período atual, ou None se não tem tempo registrado."""
+        bucket = period_buckets(now if now is not None else time.time(), self.utc_offset_hours)[period]
+        with self._io_lock:
+            row = self._conn.execute(
+                "SELECT focused_seconds FROM focus_rollups "
+                "WHERE guild_id = ? AND period = ? AND bucket = ? AND member_id = ?",
+                (guild_id, period, bucket, member_id),
+            ).fetchone()
+            if row is None:
+                return None
+            ahead = self._conn.execute(
+                "SELECT COUNT(*) FROM focus_rollups "
+                "WHERE guild_id = ? AND period = ? AND bucket = ? AND focused_seconds > ? AND member_id != ?",
+                (guild_id, period, bucket, row[0], GUILD_TOTAL),
+            ).fetchone()[0]
+        return ahead + 1, row[0]
+
+    # --- exportação/importação do histórico ---
+    def iter_history(self, guild_id: Optional[int] = None, member_id: Optional[int] = None,
+                     since: Optional[float] = None, until: Optional[float] = None,
+                     batch_size: int = 1000) -> Iterator[List[tuple]]:
+        """Histórico filtrado (por `ended_at` em [since, until)), em lotes na ordem de gravação.
+
+        Cada lote é uma consulta curta que continua do último id lido, então o
+        lock não fica preso entre lotes e a memória não cresce com o histórico.
+        """
+        conditions, params = [], []
+        for column, op, value in (("guild_id", "=", guild_id), ("member_id", "=", member_id),
+                                  ("ended_at", ">=", since), ("ended_at", "<", until)):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        where = "".join(f" AND {c}" for c in conditions)
+        query = (f"SELECT id, {', '.join(HISTORY_COLUMNS)} FROM session_history "
+                 f"WHERE id > ?{where} ORDER BY id LIMIT ?")
+        last_id = 0
+        while True:
+            with self._io_lock:
+                rows = self._conn.execute(query, (last_id, *params, batch_size)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [row[1:] for row in rows]
+            if len(rows) < batch_size:
+                return
+
+    def import_history(self, rows: Iterable[tuple], batch_size: int = 1000) -> Tuple[int, int]:
+        """Grava sessões finalizadas em lotes (uma transação cada) e soma nos agregados.
+
+        Linhas já presentes (mesmo servidor, membro, início e fim) são puladas,
+        então importar o mesmo arquivo de novo não conta nada em dobro.
+        Devolve (importadas, repetidas).
+        """
+        imported = skipped = 0
+        batch: List[tuple] = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                added = self._import_batch(batch)
+                imported, skipped = imported + added, skipped + len(batch) - added
+                batch = []
+        if batch:
+            added = self._import_batch(batch)
+            imported, skipped = imported + added, skipped + len(batch) - added
+        return imported, skipped
+
+    def _import_batch(self, batch: List[tuple]) -> int:
+        with self._io_lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                new, seen = [], set()
+                for row in batch:
+                    guild_id, member_id, _mode, started_at, ended_at, _seconds = row
+                    key = (guild_id, member_id, started_at, ended_at)
+                    if key in seen or conn.execute(
+                        "SELECT 1 FROM session_history "
+                        "WHERE guild_id = ? AND member_id = ? AND ended_at = ? AND started_at = ? LIMIT 1",
+                        (guild_id, member_id, ended_at, started_at),
+                    ).fetchone():
+                        continue
+                    seen.add(key)
+                    new.append(row)
+                if new:
+                    conn.executemany(
+                        f"INSERT INTO session_history ({', '.join(HISTORY_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                        new,
+                    )
+                    conn.executemany(_ROLLUP_UPSERT, self._rollup_rows(new))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self.rows_written += len(new)
+        return len(new)
+
+
+# --- backends disponíveis ---
+BackendFactory = Callable[..., SessionBackend]
+BACKENDS: Dict[str, BackendFactory] = {"sqlite": SessionStore}
+
+
+def register_backend(scheme: str, factory: BackendFactory):
+    """Disponibiliza um backend para `open_backend` (ex.: "redis" -> RedisSessionBackend)."""
+    BACKENDS[scheme] = factory
+
+
+def open_backend(url: str, **kwargs) -> SessionBackend:
+    """Cria o backend a partir de uma URL: "sqlite:///pomoallos.db" (ou só o caminho do arquivo)."""
+    scheme, sep, rest = url.partition("://")
+    if not sep:
+        scheme, rest = "sqlite", url
+    elif scheme == "sqlite":
+        rest = rest[1:] if rest.startswith("/") else rest  # sqlite:///relativo.db, sqlite:////abs.db
+    factory = BACKENDS.get(scheme)
+    if factory is None:
+        raise ValueError(f"backend de sessões desconhecido: {scheme!r} (disponíveis: {', '.join(sorted(BACKENDS))})")
+    return factory(rest, **kwargs)